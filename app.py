@@ -1,30 +1,65 @@
 """Main app."""
+import time
+
+STARTED = time.perf_counter()
+
 from typing import Optional, Iterable
 
-from client.bot import Bot
-from client.cogs import RedditCommands, CommandsErrorHandler
+from client.bot import Bot, ShardedBot
+from client.cogs import RedditCommands, CommandsErrorHandler, ProfilingCommands
+from client.profiling import StartupTimer
 import plugins
 import config
 
 
 def create_bot(
-    configuration: object, cogs: Optional[Iterable] = (), command_prefix: str = "!"
+    configuration: object,
+    cogs: Optional[Iterable] = (),
+    command_prefix: str = "!",
+    startup: Optional[StartupTimer] = None,
 ) -> Bot:
-    """Create bot."""
-    bot = Bot(command_prefix=command_prefix)
+    """Create bot, sharded when a shard count is configured."""
+    if shard_count := getattr(configuration, "SHARD_COUNT", 0):
+        bot = ShardedBot(
+            command_prefix=command_prefix,
+            shard_count=shard_count,
+            shard_ids=getattr(configuration, "SHARD_IDS", None) or None,
+        )
+    else:
+        bot = Bot(command_prefix=command_prefix)
     bot.config = configuration
-    [bot.add_cog(cog(bot=bot)) for cog in cogs]
+    bot.startup = startup or StartupTimer()
+    for cog in cogs:
+        bot.add_cog(cog(bot=bot))
+        bot.startup.mark(f"cog {cog.__name__}")
     return bot
 
 
+def enabled_plugins(configuration: object) -> list:
+    """Plugin cogs to load, all of them unless PLUGINS names some."""
+    names = set(getattr(configuration, "PLUGINS", None) or ())
+    return [
+        plugins.load(plugin)
+        for plugin in plugins.Cogs
+        if not names or names & {plugin[0], plugin[1]}
+    ]
+
+
 if __name__ == "__main__":
     """Main function."""
+    startup = StartupTimer(started=STARTED)
+    startup.mark("imports")
+    configuration = config.get_config(config.ENVIRONMENT)
+    config.setup_logging(name=configuration.PROCESS_NAME or None)
+    startup.mark("config")
     commands = (
         RedditCommands,
         CommandsErrorHandler,
-        *plugins.Cogs,
+        ProfilingCommands,
+        *enabled_plugins(configuration),
     )
+    startup.mark("plugins")
     discord_bot = create_bot(
-        configuration=config.get_config(config.ENVIRONMENT), cogs=commands
+        configuration=configuration, cogs=commands, startup=startup
     )
     discord_bot.run(discord_bot.config.DISCORD_BOT_TOKEN)
@@ -0,0 +1 @@
+"""Offline end to end benchmarks of the ingest and delivery pipeline."""
@@ -0,0 +1,83 @@
+"""Run the end to end benchmarks.
+
+    $ python -m benchmarks --subscriptions 10 100 --duration 30 --save baseline.json
+    $ python -m benchmarks --subscriptions 10 100 --duration 30 --baseline baseline.json
+"""
+import argparse
+import multiprocessing
+import queue
+from typing import Any, Dict
+
+from client.utils import create_table
+from benchmarks.scenarios import compare, load, report_scenario, save
+
+
+def parse_arguments() -> argparse.Namespace:
+    """Parse the command line."""
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument(
+        "--subscriptions", type=int, nargs="+", default=[10, 100, 1000, 10000]
+    )
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--posts-per-second", type=float, default=10)
+    parser.add_argument("--reddit-latency", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--discord-latency", type=float, default=0.05)
+    parser.add_argument("--quota", type=int, default=100000)
+    parser.add_argument(
+        "--set",
+        dest="overrides",
+        metavar="KEY=VALUE",
+        action="append",
+        default=[],
+        help="Override a bot setting, e.g. --set STREAM_ENGINE=adaptive",
+    )
+    parser.add_argument("--save", help="Write the results to a json file")
+    parser.add_argument("--baseline", help="Compare against a saved json file")
+    return parser.parse_args()
+
+
+def run_isolated(context: Any, options: Dict[str, Any]) -> Dict[str, Any]:
+    """Runs a scenario in a process of its own, which may start worker processes."""
+    results = context.Queue()
+    process = context.Process(target=report_scenario, args=(options, results))
+    process.start()
+    while True:
+        try:
+            result = results.get(timeout=1)
+            break
+        except queue.Empty:
+            if not process.is_alive():
+                raise RuntimeError(f"Scenario exited with code {process.exitcode}")
+    process.join()
+    return result
+
+
+def main() -> None:
+    """Run every scenario in its own process and report the results."""
+    arguments = parse_arguments()
+    options = {
+        "duration": arguments.duration,
+        "posts_per_second": arguments.posts_per_second,
+        "reddit_latency": arguments.reddit_latency,
+        "error_rate": arguments.error_rate,
+        "discord_latency": arguments.discord_latency,
+        "quota": arguments.quota,
+        "overrides": dict(item.split("=", 1) for item in arguments.overrides),
+    }
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for subscriptions in arguments.subscriptions:
+        result = run_isolated(context, {**options, "subscriptions": subscriptions})
+        results.append(result)
+        print(create_table([result], tablefmt="simple"), end="\n\n", flush=True)
+    if arguments.save:
+        save(arguments.save, results, options)
+    if arguments.baseline:
+        print(
+            create_table(compare(results, load(arguments.baseline)), tablefmt="simple")
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""A local stand in for the Discord objects used by the bot."""
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+from discord import Embed
+
+
+class FakeChannel:
+    """Records the embeds sent to it along with when they arrived."""
+
+    def __init__(
+        self, channel_id: int, latency: Optional[float] = 0.0, name: str = None
+    ) -> None:
+        """Init method."""
+        self.id = channel_id
+        self.name = name or f"channel-{channel_id}"
+        self.latency = latency
+        self.received: List[Dict] = []
+        self.messages = 0
+
+    async def send(
+        self,
+        content: Optional[str] = None,
+        embed: Optional[Embed] = None,
+        embeds: Optional[List[Embed]] = None,
+    ) -> None:
+        """Pretends to send a message."""
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        embeds = [embed] if embed else embeds or []
+        self.receive([embed.to_dict() for embed in embeds])
+
+    def receive(self, embeds: List[Dict]) -> None:
+        """Records a message holding the given embeds."""
+        now = time.time()
+        self.messages += 1
+        self.received.extend({"url": embed.get("url"), "at": now} for embed in embeds)
+
+
+class FakeHTTP:
+    """Handles the raw message route used for several embeds at once."""
+
+    def __init__(self, bot: "FakeBot") -> None:
+        """Init method."""
+        self.bot = bot
+
+    async def request(self, route, json: Optional[Dict] = None, **kwargs) -> None:
+        """Delivers a raw message to the channel of the route."""
+        channel = self.bot.get_channel(route.channel_id)
+        if channel.latency:
+            await asyncio.sleep(channel.latency)
+        channel.receive((json or {}).get("embeds", []))
+
+
+class FakeBot:
+    """The parts of the bot the reddit cog relies on."""
+
+    sharded = False
+    shard_share = 1.0
+
+    def __init__(self, config: object, latency: Optional[float] = 0.0) -> None:
+        """Init method."""
+        self.config = config
+        self.latency = latency
+        self.loop = asyncio.get_event_loop()
+        self.http = FakeHTTP(self)
+        self.channels: Dict[int, FakeChannel] = {}
+
+    def add_channel(self, channel_id: int) -> FakeChannel:
+        """Creates a channel the bot can post to."""
+        channel = self.channels[channel_id] = FakeChannel(
+            channel_id, latency=self.latency
+        )
+        return channel
+
+    def get_channel(self, channel_id: int) -> Optional[FakeChannel]:
+        """Returns a channel by id."""
+        return self.channels.get(channel_id)
+
+    def is_ready(self) -> bool:
+        """The fake bot is ready as soon as it exists."""
+        return True
+
+    async def wait_until_ready(self) -> None:
+        """Returns at once, see is_ready."""
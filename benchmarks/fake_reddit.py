@@ -0,0 +1,249 @@
+"""A local stand in for the Reddit endpoints used by the bot."""
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from collections import Counter, defaultdict, deque
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+from aiohttp import web
+
+
+def base36(number: int) -> str:
+    """Encodes a number the way Reddit encodes ids."""
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    encoded = ""
+    while True:
+        number, remainder = divmod(number, 36)
+        encoded = digits[remainder] + encoded
+        if not number:
+            return encoded
+
+
+class FakeReddit:
+    """Serves generated posts through the listing and about endpoints.
+
+    Each subreddit posts at random, posts_per_second on average split evenly
+    across subreddits, and starts with about backlog older posts. Posts are
+    generated lazily up to the time of each request, so their creation time is
+    exact no matter how often they are polled. Every response waits for latency
+    seconds give or take jitter, and error_rate of them fail with a 503.
+    """
+
+    def __init__(
+        self,
+        subreddits: Iterable[str],
+        posts_per_second: Optional[float] = 10,
+        latency: Optional[float] = 0.05,
+        jitter: Optional[float] = 0.5,
+        error_rate: Optional[float] = 0.0,
+        quota: Optional[int] = 100000,
+        window: Optional[int] = 600,
+        history: Optional[int] = 100,
+        backlog: Optional[int] = 5,
+        seed: Optional[int] = 0,
+        host: Optional[str] = "127.0.0.1",
+        port: Optional[int] = 0,
+    ) -> None:
+        """Init method."""
+        self.subreddits = list(subreddits)
+        self.rate = posts_per_second / max(len(self.subreddits), 1)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.quota = quota
+        self.window = window
+        self.rng = random.Random(seed)
+        self.host = host
+        self.port = port
+        self.started = time.time()
+        self.posts: Dict[str, Deque[Dict[str, Any]]] = defaultdict(
+            lambda: deque(maxlen=history)
+        )
+        self.next_post = {
+            subreddit: self.started
+            - backlog / self.rate
+            + self.rng.expovariate(self.rate)
+            for subreddit in self.subreddits
+        }
+        self.created: Dict[str, float] = {}
+        self.ids = itertools.count(36**5)
+        self.calls: Counter = Counter()
+        self.errors = 0
+        self.runner: Optional[web.AppRunner] = None
+
+    @property
+    def url(self) -> str:
+        """Base url of the running server."""
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def api_calls(self) -> int:
+        """Requests served, not counting authentication."""
+        return sum(self.calls.values()) - self.calls["access_token"]
+
+    def generate(self, subreddit: str, now: float) -> None:
+        """Creates the posts of a subreddit due by now."""
+        if subreddit not in self.next_post:
+            return
+        while self.next_post[subreddit] <= now:
+            created = self.next_post[subreddit]
+            post_id = base36(next(self.ids))
+            self.created[post_id] = created
+            self.posts[subreddit].append(
+                {
+                    "id": post_id,
+                    "name": f"t3_{post_id}",
+                    "title": f"Post {post_id} in r/{subreddit}",
+                    "selftext_html": f"<p>Body of <b>{post_id}</b></p>" * 20,
+                    "subreddit": subreddit,
+                    "author": f"user_{post_id[-2:]}",
+                    "created_utc": created,
+                    "created": created,
+                    "edited": False,
+                    "is_self": True,
+                    "permalink": f"/r/{subreddit}/comments/{post_id}/",
+                    "url": f"https://www.reddit.com/r/{subreddit}/comments/{post_id}/",
+                }
+            )
+            self.next_post[subreddit] = created + self.rng.expovariate(self.rate)
+
+    def listing(self, names: List[str], limit: int, after: Optional[str]) -> Dict:
+        """The newest posts of the subreddits, paged like Reddit does."""
+        now = time.time()
+        for name in names:
+            self.generate(name, now)
+        posts = heapq.merge(
+            *(reversed(self.posts[name]) for name in names),
+            key=lambda post: post["created_utc"],
+            reverse=True,
+        )
+        if after:
+            posts = itertools.dropwhile(lambda post: post["name"] != after, posts)
+            next(posts, None)
+        children = [
+            {"kind": "t3", "data": post} for post in itertools.islice(posts, limit)
+        ]
+        return {
+            "kind": "Listing",
+            "data": {
+                "after": children[-1]["data"]["name"]
+                if len(children) == limit
+                else None,
+                "before": None,
+                "children": children,
+            },
+        }
+
+    def headers(self) -> Dict[str, str]:
+        """Rate limit headers of the current window."""
+        elapsed = time.time() - self.started
+        used = self.api_calls % self.quota
+        return {
+            "x-ratelimit-remaining": str(float(self.quota - used)),
+            "x-ratelimit-used": str(used),
+            "x-ratelimit-reset": str(int(self.window - elapsed % self.window)),
+        }
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler) -> web.Response:
+        """Adds latency, errors and rate limit headers to every response."""
+        name = request.match_info.route.name or "unknown"
+        self.calls[name] += 1
+        if self.latency:
+            await asyncio.sleep(
+                self.latency * self.rng.uniform(1 - self.jitter, 1 + self.jitter)
+            )
+        if name != "access_token" and self.rng.random() < self.error_rate:
+            self.errors += 1
+            return web.json_response({"message": "Unavailable"}, status=503)
+        response = await handler(request)
+        response.headers.update(self.headers())
+        return response
+
+    async def access_token(self, request: web.Request) -> web.Response:
+        """Grants a token to any client."""
+        return web.json_response(
+            {
+                "access_token": "benchmark",
+                "expires_in": 86400,
+                "scope": "*",
+                "token_type": "bearer",
+            }
+        )
+
+    async def new(self, request: web.Request) -> web.Response:
+        """Newest posts of one or more subreddits joined by plus signs.
+        Other sort orders are answered with the same posts.
+        """
+        names = request.match_info["names"].lower().split("+")
+        limit = min(int(request.query.get("limit", 25)), 100)
+        return web.json_response(
+            self.listing(names, limit=limit, after=request.query.get("after"))
+        )
+
+    async def subreddit_about(self, request: web.Request) -> web.Response:
+        """Details of a subreddit, or a redirect to search when it is unknown."""
+        name = request.match_info["name"].lower()
+        if name not in self.next_post:
+            raise web.HTTPFound(f"/subreddits/search?q={name}")
+        return web.json_response(
+            {
+                "kind": "t5",
+                "data": {"display_name": name, "id": name, "name": f"t5_{name}"},
+            }
+        )
+
+    async def user_about(self, request: web.Request) -> web.Response:
+        """Details of a redditor, any name exists."""
+        name = request.match_info["name"]
+        return web.json_response(
+            {
+                "kind": "t2",
+                "data": {
+                    "name": name,
+                    "id": name,
+                    "icon_img": f"https://example.com/{name}.png",
+                },
+            }
+        )
+
+    async def search_names(self, request: web.Request) -> web.Response:
+        """Subreddit names matching a query exactly."""
+        data = await request.post()
+        query = (data.get("query") or request.query.get("query", "")).lower()
+        return web.json_response({"names": [query] if query in self.next_post else []})
+
+    async def start(self) -> None:
+        """Starts listening, on a free port unless one was given."""
+        app = web.Application(middlewares=[self.middleware])
+        app.router.add_post(
+            "/api/v1/access_token", self.access_token, name="access_token"
+        )
+        app.router.add_get("/r/{names}/new", self.new, name="new")
+        app.router.add_get(
+            "/r/{names}/{sort:hot|top|rising|controversial}", self.new, name="sorted"
+        )
+        app.router.add_get(
+            "/r/{name}/about{slash:/?}", self.subreddit_about, name="about"
+        )
+        app.router.add_get(
+            "/user/{name}/about{slash:/?}", self.user_about, name="user_about"
+        )
+        app.router.add_post(
+            "/api/search_reddit_names{slash:/?}",
+            self.search_names,
+            name="search_names",
+        )
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        """Stops listening."""
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
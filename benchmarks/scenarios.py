@@ -0,0 +1,147 @@
+"""End to end scenarios run against the fake Reddit and Discord."""
+import asyncio
+import json
+import os
+import resource
+import statistics
+import tempfile
+import time
+from typing import Any, Dict, Optional
+
+from benchmarks.fake_discord import FakeBot
+from benchmarks.fake_reddit import FakeReddit
+from client.cogs import RedditCommands
+from config import BaseConfig
+
+METRICS = (
+    ("posts_per_second", True),
+    ("p50_latency", False),
+    ("p99_latency", False),
+    ("api_calls_per_post", False),
+    ("memory_mb", False),
+)
+
+
+class BenchmarkConfig(BaseConfig):
+    """Configuration that needs no environment and keeps the bot offline."""
+
+    DISCORD_BOT_TOKEN = "benchmark"
+    REDDIT_CLIENT_ID = "benchmark"
+    REDDIT_CLIENT_SECRET = "benchmark"
+    DISCORD_BOT_ADVANCED_COMMANDS_ROLES = []
+    DISCORD_BOT_NORMAL_COMMANDS_ROLES = []
+    METRICS_PORT = 0
+
+
+def percentile(values: list, q: float) -> Optional[float]:
+    """The q percentile of values, None when there are none."""
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(q) - 1]
+
+
+async def measure(
+    subscriptions: int,
+    duration: float,
+    posts_per_second: float,
+    reddit_latency: float,
+    error_rate: float,
+    discord_latency: float,
+    quota: int,
+    overrides: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Streams the given number of subscriptions and measures the deliveries."""
+    names = [f"bench{index}" for index in range(subscriptions)]
+    reddit = FakeReddit(
+        subreddits=names,
+        posts_per_second=posts_per_second,
+        latency=reddit_latency,
+        error_rate=error_rate,
+        quota=quota,
+    )
+    await reddit.start()
+    directory = tempfile.mkdtemp(prefix="benchmark-")
+    config = BenchmarkConfig()
+    config.REDDIT_OAUTH_URL = config.REDDIT_URL = reddit.url
+    config.FILENAME = os.path.join(directory, "subreddits.json")
+    config.DATABASE = os.path.join(directory, "bot.sqlite3")
+    for key, value in overrides.items():
+        setattr(config, key, type(getattr(config, key))(value))
+
+    bot = FakeBot(config=config, latency=discord_latency)
+    [bot.add_channel(index) for index in range(subscriptions)]
+    cog = RedditCommands(bot=bot)
+    cog.reddit.subscriptions.subscribe(list(enumerate(names)))
+    started = time.time()
+    await asyncio.sleep(duration)
+    ended = time.time()
+    await cog.close()
+    await reddit.close()
+
+    latencies = sorted(
+        message["at"] - reddit.created[message["url"].rsplit("/", 1)[-1]]
+        for channel in bot.channels.values()
+        for message in channel.received
+    )
+    generated = sum(started <= created < ended for created in reddit.created.values())
+    return {
+        "subscriptions": subscriptions,
+        "duration": round(ended - started, 2),
+        "posts_generated": generated,
+        "posts_delivered": len(latencies),
+        "posts_per_second": round(len(latencies) / (ended - started), 2),
+        "p50_latency": percentile(latencies, 50),
+        "p99_latency": percentile(latencies, 99),
+        "api_calls": reddit.api_calls,
+        "api_calls_per_post": round(reddit.api_calls / len(latencies), 3)
+        if latencies
+        else None,
+        "injected_errors": reddit.errors,
+        "memory_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+    }
+
+
+def run_scenario(options: Dict[str, Any]) -> Dict[str, Any]:
+    """Runs one scenario in a fresh event loop."""
+    os.environ.setdefault("praw_check_for_updates", "False")
+    return asyncio.run(measure(**options))
+
+
+def report_scenario(options: Dict[str, Any], results: Any) -> None:
+    """Runs one scenario and puts its result on a multiprocessing queue."""
+    results.put(run_scenario(options))
+
+
+def compare(results: list, baseline: list) -> list:
+    """Relative change of every metric against the baseline, in percent."""
+    previous = {result["subscriptions"]: result for result in baseline}
+    changes = []
+    for result in results:
+        if (old := previous.get(result["subscriptions"])) is None:
+            continue
+        change = {"subscriptions": result["subscriptions"]}
+        for name, higher_is_better in METRICS:
+            if not old.get(name) or result.get(name) is None:
+                change[name] = None
+                continue
+            delta = (result[name] - old[name]) / old[name] * 100
+            worse = delta < 0 if higher_is_better else delta > 0
+            change[name] = f"{delta:+.1f}%{' worse' if worse else ''}"
+        changes.append(change)
+    return changes
+
+
+def load(filename: str) -> list:
+    """Reads results saved by a previous run."""
+    with open(filename, encoding="utf-8") as file:
+        return json.load(file)["results"]
+
+
+def save(filename: str, results: list, options: Dict[str, Any]) -> None:
+    """Writes results so later runs can compare against them."""
+    with open(filename, "w", encoding="utf-8") as file:
+        json.dump({"options": options, "results": results}, file, indent=2)
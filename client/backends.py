@@ -0,0 +1,480 @@
+"""Collection of storage backends."""
+import asyncio
+import copy
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+Pair = Tuple[int, str]
+
+
+class Storage:
+    """Mixin for storing data.
+
+    Saves are written behind: changes made within delay seconds of each other are
+    coalesced into one write, which is serialized and written in a worker thread.
+    Files are replaced atomically, so a crash never leaves a partial file behind.
+    Call flush before shutting down to write pending changes.
+    """
+
+    def __init__(self, filename: str = "data.json", delay: float = 1.0) -> None:
+        """Initialize the mixin."""
+        self.filename = filename
+        self.delay = delay
+        self._pending: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    def get(
+        self,
+        default: Optional[Dict[str, Any]] = None,
+        callback: Optional[Callable] = None,
+    ) -> dict:
+        """Retrieves data from the given filename as a serialized json object.
+        Or creates a file with the default if it doesn't exist.
+        An unreadable file is kept next to the new one with a .corrupt suffix.
+        """
+
+        data = default or {}
+        try:
+            with open(self.filename, "r") as file:
+                data = json.load(file)
+        except json.decoder.JSONDecodeError:
+            os.replace(self.filename, f"{self.filename}.corrupt")
+            self.set(data)
+        except FileNotFoundError:
+            self.set(data)
+        if callback:
+            callback()
+        return data
+
+    def set(self, data: Dict[str, Any], callback: Optional[Callable] = None) -> None:
+        """Schedules the given data to be saved in json format.
+        Saves immediately when no event loop is running.
+        """
+        self._pending = data
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush_now()
+        else:
+            if self._task is None:
+                self._task = loop.create_task(self._write_behind())
+        if callback:
+            callback()
+
+    async def _write_behind(self) -> None:
+        """Waits for more changes, then writes them all at once."""
+        try:
+            await asyncio.sleep(self.delay)
+            await self.flush()
+        finally:
+            self._task = None
+
+    async def flush(self) -> None:
+        """Writes pending changes in a worker thread."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while self._pending is not None:
+                snapshot = self.snapshot(self._pending)
+                self._pending = None
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self.write, snapshot
+                )
+
+    def flush_now(self) -> None:
+        """Writes pending changes synchronously."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._pending is not None:
+            snapshot = self.snapshot(self._pending)
+            self._pending = None
+            self.write(snapshot)
+
+    @staticmethod
+    def snapshot(data: Dict[str, Any]) -> Dict[str, Any]:
+        """Copies the top level containers so the loop can keep mutating them.
+        Their items are treated as immutable records.
+        """
+        return {key: copy.copy(value) for key, value in data.items()}
+
+    def write(self, data: Dict[str, Any]) -> None:
+        """Atomically replaces the file with the given data."""
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        descriptor, path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "w") as file:
+                json.dump(data, file)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(path, self.filename)
+        except BaseException:
+            os.unlink(path)
+            raise
+
+
+class StorageBackend:
+    """Interface of the stores holding subscriptions, bans and bot state.
+
+    The subscription store keeps everything in memory and reports each change
+    to the backend, which decides how to persist it. A shared backend can be
+    written by several processes at once, so its readers reload it.
+    """
+
+    shared: bool = False
+
+    def load(
+        self,
+        default: Optional[Dict[str, Any]] = None,
+        callback: Optional[Callable] = None,
+    ) -> Dict[str, Any]:
+        """Returns the subscriptions and bans as a json document."""
+        raise NotImplementedError
+
+    def save(
+        self,
+        document: Callable[[], Dict[str, Any]],
+        subscribed: Iterable[Pair] = (),
+        unsubscribed: Iterable[Pair] = (),
+        banned: Iterable[str] = (),
+        unbanned: Iterable[str] = (),
+        callback: Optional[Callable] = None,
+    ) -> None:
+        """Persists a change. document builds the full json document on demand."""
+        raise NotImplementedError
+
+    def get_state(self, key: str, default: Any = None) -> Any:
+        """Returns a json serializable piece of bot state."""
+        raise NotImplementedError
+
+    def set_state(self, key: str, value: Any) -> None:
+        """Stores a json serializable piece of bot state."""
+        raise NotImplementedError
+
+    def get_cursors(self) -> Dict[str, Tuple[str, float]]:
+        """Returns the last delivered submission id and time of each subreddit."""
+        return {
+            subreddit: tuple(cursor)
+            for subreddit, cursor in self.get_state("cursors", {}).items()
+        }
+
+    def set_cursors(self, cursors: Dict[str, Tuple[str, float]]) -> None:
+        """Stores the last delivered submission id and time of subreddits."""
+        self.set_state("cursors", {**self.get_state("cursors", {}), **cursors})
+
+    async def flush(self) -> None:
+        """Waits until every change is persisted."""
+
+    def flush_now(self) -> None:
+        """Persists every change synchronously."""
+
+    async def close(self) -> None:
+        """Persists every change and releases resources."""
+        await self.flush()
+
+
+class JSONBackend(StorageBackend):
+    """Keeps the document in a json file and each piece of state next to it.
+    State values must be json objects.
+    """
+
+    def __init__(self, filename: str = "data.json", delay: float = 1.0) -> None:
+        """Init method."""
+        self.storage = Storage(filename=filename, delay=delay)
+        self.directory = os.path.dirname(os.path.abspath(filename))
+        self.delay = delay
+        self.states: Dict[str, Storage] = {}
+        self.values: Dict[str, Any] = {}
+
+    def state_storage(self, key: str) -> Storage:
+        """Returns the storage of a piece of state."""
+        if key not in self.states:
+            self.states[key] = Storage(
+                filename=os.path.join(self.directory, f"{key}.json"), delay=self.delay
+            )
+        return self.states[key]
+
+    def load(
+        self,
+        default: Optional[Dict[str, Any]] = None,
+        callback: Optional[Callable] = None,
+    ) -> Dict[str, Any]:
+        """Returns the subscriptions and bans as a json document."""
+        return self.storage.get(default=default, callback=callback)
+
+    def save(
+        self,
+        document: Callable[[], Dict[str, Any]],
+        subscribed: Iterable[Pair] = (),
+        unsubscribed: Iterable[Pair] = (),
+        banned: Iterable[str] = (),
+        unbanned: Iterable[str] = (),
+        callback: Optional[Callable] = None,
+    ) -> None:
+        """Rewrites the whole document behind the event loop."""
+        self.storage.set(document(), callback=callback)
+
+    def get_state(self, key: str, default: Any = None) -> Any:
+        """Returns a json serializable piece of bot state, default if never stored."""
+        if key not in self.values:
+            storage = self.state_storage(key)
+            if not os.path.exists(storage.filename):
+                return default
+            self.values[key] = storage.get(default=default)
+        return self.values[key]
+
+    def set_state(self, key: str, value: Any) -> None:
+        """Stores a json serializable piece of bot state."""
+        self.values[key] = value
+        self.state_storage(key).set(value)
+
+    async def flush(self) -> None:
+        """Waits until every change is written."""
+        for storage in (self.storage, *self.states.values()):
+            await storage.flush()
+
+    def flush_now(self) -> None:
+        """Writes every change synchronously."""
+        for storage in (self.storage, *self.states.values()):
+            storage.flush_now()
+
+
+class SQLiteBackend(StorageBackend):
+    """Keeps subscriptions, bans, cursors and bot state in a SQLite database.
+
+    The database runs in WAL mode and is only touched from a dedicated thread,
+    so changes are queued there in order and never block the event loop. Only
+    the rows that changed are written.
+    """
+
+    shared: bool = True
+
+    SCHEMA = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "CREATE TABLE IF NOT EXISTS subscriptions ("
+        "channel_id INTEGER NOT NULL, subreddit TEXT NOT NULL, "
+        "PRIMARY KEY (channel_id, subreddit))",
+        "CREATE INDEX IF NOT EXISTS subscriptions_subreddit "
+        "ON subscriptions (subreddit)",
+        "CREATE TABLE IF NOT EXISTS bans (subreddit TEXT PRIMARY KEY)",
+        "CREATE TABLE IF NOT EXISTS cursors ("
+        "subreddit TEXT PRIMARY KEY, submission_id TEXT NOT NULL, "
+        "created_utc REAL NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    )
+
+    def __init__(self, database: str = "data.sqlite3") -> None:
+        """Init method."""
+        self.database = database
+        self.connection: Optional[sqlite3.Connection] = None
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="sqlite", initializer=self._connect
+        )
+        self.call(lambda connection: None).result()
+
+    def _connect(self) -> None:
+        """Opens the connection inside the dedicated thread."""
+        self.connection = sqlite3.connect(self.database)
+        for statement in self.SCHEMA:
+            self.connection.execute(statement)
+        self.connection.commit()
+
+    def call(self, function: Callable[[sqlite3.Connection], Any]) -> Future:
+        """Queues function(connection) on the database thread."""
+        return self.executor.submit(lambda: function(self.connection))
+
+    def transaction(self, *statements: Tuple[str, Iterable]) -> Future:
+        """Queues (sql, rows) statements to run in a single transaction."""
+
+        def run(connection: sqlite3.Connection) -> None:
+            with connection:
+                for sql, rows in statements:
+                    connection.executemany(sql, rows)
+
+        future = self.call(run)
+        future.add_done_callback(self._log_error)
+        return future
+
+    @staticmethod
+    def _log_error(future: Future) -> None:
+        """Logs errors of queued writes nobody waits for."""
+        if (error := future.exception()) is not None:
+            logging.getLogger(__name__).error(f"SQLite write failed: {error!r}")
+
+    def is_empty(self) -> bool:
+        """Checks if nothing has been stored yet."""
+        return not self.call(
+            lambda connection: connection.execute(
+                "SELECT EXISTS (SELECT 1 FROM subscriptions) "
+                "OR EXISTS (SELECT 1 FROM bans) OR EXISTS (SELECT 1 FROM state)"
+            ).fetchone()[0]
+        ).result()
+
+    def load(
+        self,
+        default: Optional[Dict[str, Any]] = None,
+        callback: Optional[Callable] = None,
+    ) -> Dict[str, Any]:
+        """Returns the subscriptions and bans as a json document."""
+
+        def read(connection: sqlite3.Connection) -> Dict[str, Any]:
+            return {
+                "subscribed": [
+                    {"channel_id": channel_id, "subreddit": subreddit}
+                    for channel_id, subreddit in connection.execute(
+                        "SELECT channel_id, subreddit FROM subscriptions"
+                    )
+                ],
+                "banned": [
+                    subreddit
+                    for (subreddit,) in connection.execute("SELECT subreddit FROM bans")
+                ],
+            }
+
+        data = self.call(read).result()
+        if callback:
+            callback()
+        return data
+
+    def save(
+        self,
+        document: Callable[[], Dict[str, Any]],
+        subscribed: Iterable[Pair] = (),
+        unsubscribed: Iterable[Pair] = (),
+        banned: Iterable[str] = (),
+        unbanned: Iterable[str] = (),
+        callback: Optional[Callable] = None,
+    ) -> None:
+        """Queues the changed rows."""
+        self.transaction(
+            (
+                "INSERT OR IGNORE INTO subscriptions (channel_id, subreddit) "
+                "VALUES (?, ?)",
+                list(subscribed),
+            ),
+            (
+                "DELETE FROM subscriptions WHERE channel_id = ? AND subreddit = ?",
+                list(unsubscribed),
+            ),
+            (
+                "INSERT OR IGNORE INTO bans (subreddit) VALUES (?)",
+                [(subreddit,) for subreddit in banned],
+            ),
+            (
+                "DELETE FROM bans WHERE subreddit = ?",
+                [(subreddit,) for subreddit in unbanned],
+            ),
+        )
+        if callback:
+            callback()
+
+    def get_state(self, key: str, default: Any = None) -> Any:
+        """Returns a json serializable piece of bot state."""
+        row = self.call(
+            lambda connection: connection.execute(
+                "SELECT value FROM state WHERE key = ?", (key,)
+            ).fetchone()
+        ).result()
+        return default if row is None else json.loads(row[0])
+
+    def set_state(self, key: str, value: Any) -> None:
+        """Queues a piece of bot state to be stored."""
+
+        def write(connection: sqlite3.Connection) -> None:
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)",
+                    (key, json.dumps(value)),
+                )
+
+        self.call(write).add_done_callback(self._log_error)
+
+    def get_cursors(self) -> Dict[str, Tuple[str, float]]:
+        """Returns the last delivered submission id and time of each subreddit."""
+        return self.call(
+            lambda connection: {
+                subreddit: (submission_id, created_utc)
+                for subreddit, submission_id, created_utc in connection.execute(
+                    "SELECT subreddit, submission_id, created_utc FROM cursors"
+                )
+            }
+        ).result()
+
+    def set_cursors(self, cursors: Dict[str, Tuple[str, float]]) -> None:
+        """Queues the cursors of subreddits to be stored."""
+        self.transaction(
+            (
+                "INSERT OR REPLACE INTO cursors (subreddit, submission_id, created_utc) "
+                "VALUES (?, ?, ?)",
+                [
+                    (subreddit, submission_id, created_utc)
+                    for subreddit, (submission_id, created_utc) in cursors.items()
+                ],
+            )
+        )
+
+    async def flush(self) -> None:
+        """Waits until every queued change is committed."""
+        await asyncio.wrap_future(self.call(lambda connection: None))
+
+    def flush_now(self) -> None:
+        """Blocks until every queued change is committed."""
+        self.call(lambda connection: None).result()
+
+    async def close(self) -> None:
+        """Commits queued changes and closes the database."""
+        await asyncio.wrap_future(self.call(lambda connection: connection.close()))
+        self.executor.shutdown(wait=False)
+
+
+def migrate_json(filename: str, backend: SQLiteBackend) -> bool:
+    """Copies the json subscriptions and state into an empty SQLite backend.
+    The json files are renamed with a .migrated suffix so this only runs once.
+    """
+    if not os.path.exists(filename) or not backend.is_empty():
+        return False
+    source = JSONBackend(filename=filename)
+    data = source.load(default={"subscribed": [], "banned": []})
+    backend.save(
+        document=lambda: data,
+        subscribed=[
+            (sub["channel_id"], sub["subreddit"]) for sub in data.get("subscribed", [])
+        ],
+        banned=data.get("banned", []),
+    )
+    migrated = [filename]
+    for entry in os.listdir(source.directory):
+        path = os.path.join(source.directory, entry)
+        key, extension = os.path.splitext(entry)
+        if extension != ".json" or path == os.path.abspath(filename):
+            continue
+        backend.set_state(key, source.get_state(key, default={}))
+        migrated.append(path)
+    backend.flush_now()
+    for path in migrated:
+        os.replace(path, f"{path}.migrated")
+    return True
+
+
+def create_backend(
+    name: str = "json",
+    filename: str = "data.json",
+    database: str = "data.sqlite3",
+    delay: float = 1.0,
+) -> StorageBackend:
+    """Creates the configured backend, migrating json data into SQLite once."""
+    if name.lower() == "json":
+        return JSONBackend(filename=filename, delay=delay)
+    elif name.lower() == "sqlite":
+        backend = SQLiteBackend(database=database)
+        migrate_json(filename=filename, backend=backend)
+        return backend
+    else:
+        raise ValueError(f"Invalid storage backend: {name}")
@@ -1,7 +1,9 @@
 """Collection of bots."""
+import logging
 
 from discord.ext import commands
 
+from client.profiling import StartupTimer
 from config import BaseConfig
 
 
@@ -9,7 +11,54 @@ class Bot(commands.Bot):
     """Main bot class."""
 
     config: BaseConfig
+    startup: StartupTimer
+    sharded: bool = False
+
+    @property
+    def shard_share(self) -> float:
+        """Fraction of the gateway shards run by this process."""
+        return 1.0
+
+    async def login(self, *args, **kwargs) -> None:
+        """Log in, timing it as a startup phase."""
+        await super().login(*args, **kwargs)
+        if startup := getattr(self, "startup", None):
+            startup.mark("login")
 
     async def on_ready(self) -> None:
         """Bot ready event."""
         print(f"{self.user.name} has connected to Discord!")
+        if (startup := getattr(self, "startup", None)) and not startup.done:
+            startup.mark("gateway")
+            startup.done = True
+            print(startup.report())
+            logging.getLogger(self.config.LOGFILENAME).info(startup.report())
+
+    async def close(self) -> None:
+        """Let cogs release their resources before disconnecting."""
+        for cog in tuple(self.cogs.values()):
+            if close := getattr(cog, "close", None):
+                await close()
+        await super().close()
+
+
+class ShardedBot(Bot, commands.AutoShardedBot):
+    """Bot running a range of the gateway shards.
+
+    Every shard has its own gateway connection and only the guilds of the
+    shards run by this process are cached, so several processes started with
+    different shard ids split the guilds between them.
+    """
+
+    sharded: bool = True
+
+    @property
+    def shard_share(self) -> float:
+        """Fraction of the gateway shards run by this process."""
+        if not self.shard_ids or not self.shard_count:
+            return 1.0
+        return len(self.shard_ids) / self.shard_count
+
+    async def on_shard_ready(self, shard_id: int) -> None:
+        """Shard ready event."""
+        print(f"Shard {shard_id} of {self.shard_count} has connected to Discord!")
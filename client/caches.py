@@ -0,0 +1,321 @@
+"""Collection of caches."""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Tuple,
+)
+
+import asyncpraw
+import asyncprawcore
+from asyncpraw.models import Redditor
+
+from client.ratelimit import BACKGROUND, INTERACTIVE, RequestBudget
+
+SUBREDDIT = "subreddit"
+REDDITOR = "redditor"
+MISSING = "missing"
+
+
+class TTLCache:
+    """A bounded least recently used mapping whose entries expire."""
+
+    def __init__(
+        self,
+        maxsize: Optional[int] = 1024,
+        ttl: Optional[float] = 3600,
+        clock: Optional[Callable[[], float]] = time.monotonic,
+    ) -> None:
+        """Init method."""
+        if maxsize < 1:
+            raise ValueError("Cache size must be a positive integer")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        """Number of entries, including expired ones not yet evicted."""
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Checks if the key has a live entry without touching the counters."""
+        if (entry := self._data.get(key)) is None:
+            return False
+        return entry[0] > self.clock()
+
+    @property
+    def hit_rate(self) -> float:
+        """Share of lookups answered from the cache."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns the cached value, or default if missing or expired."""
+        entry = self._data.get(key)
+        if entry is None or entry[0] <= self.clock():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Stores a value, evicting the least recently used entry when full."""
+        self._data[key] = (self.clock() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Removes an entry and returns its value."""
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self) -> None:
+        """Removes every entry."""
+        self._data.clear()
+
+    def dump(self) -> Dict[Hashable, Tuple[float, Any]]:
+        """Returns the live entries with their expiry times."""
+        now = self.clock()
+        return {key: entry for key, entry in self._data.items() if entry[0] > now}
+
+    def load(self, entries: Dict[Hashable, Tuple[float, Any]]) -> None:
+        """Restores entries returned by dump, skipping expired ones."""
+        now = self.clock()
+        for key, (expires, value) in sorted(entries.items(), key=lambda e: e[1][0]):
+            if expires > now:
+                self._data[key] = (expires, value)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into a single call."""
+
+    def __init__(self) -> None:
+        """Init method."""
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        """Number of calls in flight."""
+        return len(self._calls)
+
+    async def do(self, key: Hashable, function: Callable[[], Awaitable]) -> Any:
+        """Await function(), or the call already in flight for the same key."""
+        if (future := self._calls.get(key)) is None:
+            future = asyncio.ensure_future(function())
+            self._calls[key] = future
+            future.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(future)
+
+
+class AuthorCache:
+    """Caches the author details shown in embeds.
+
+    Deleted and suspended accounts are cached for negative_ttl so they are not
+    looked up again on every post. Lookups take a request token from the lane
+    of whoever needs the embed.
+    """
+
+    def __init__(
+        self,
+        maxsize: Optional[int] = 4096,
+        ttl: Optional[float] = 3600,
+        negative_ttl: Optional[float] = 600,
+        budget: Optional[RequestBudget] = None,
+    ) -> None:
+        """Init method."""
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.negative_ttl = negative_ttl
+        self.budget = budget
+        self.flight = SingleFlight()
+
+    async def get(
+        self, redditor: Optional[Redditor], lane: Optional[str] = BACKGROUND
+    ) -> Dict[str, str]:
+        """Returns the name and icon of a redditor, loading them on a miss."""
+        if redditor is None:
+            return {}
+        key = redditor.name.lower()
+        if (profile := self.cache.get(key)) is not None:
+            return profile
+        return await self.flight.do(key, lambda: self.load(key, redditor, lane))
+
+    async def load(
+        self, key: str, redditor: Redditor, lane: Optional[str] = BACKGROUND
+    ) -> Dict[str, str]:
+        """Fetches a redditor and caches the result."""
+        profile = {"name": redditor.name}
+        if self.budget:
+            await self.budget.acquire(lane)
+        try:
+            await redditor.load()
+        except (asyncprawcore.NotFound, asyncprawcore.Forbidden):
+            self.cache.set(key, profile, ttl=self.negative_ttl)
+            return profile
+        except (asyncprawcore.RequestException, asyncprawcore.ResponseException):
+            return profile
+        if getattr(redditor, "is_suspended", False):
+            self.cache.set(key, profile, ttl=self.negative_ttl)
+            return profile
+        if icon_url := getattr(redditor, "icon_img", None):
+            profile["icon_url"] = icon_url
+        self.cache.set(key, profile)
+        return profile
+
+
+class KindResolver:
+    """Resolves whether a name is a subreddit, a redditor or missing.
+
+    Answers are cached with separate time to live values for found and missing
+    names. Expiry uses wall clock time so the cache can be saved to and loaded
+    from storage across restarts.
+    """
+
+    def __init__(
+        self,
+        reddit: asyncpraw.Reddit,
+        maxsize: Optional[int] = 10000,
+        positive_ttl: Optional[float] = 86400,
+        negative_ttl: Optional[float] = 3600,
+        budget: Optional[RequestBudget] = None,
+    ) -> None:
+        """Init method."""
+        self.reddit = reddit
+        self.cache = TTLCache(maxsize=maxsize, ttl=positive_ttl, clock=time.time)
+        self.negative_ttl = negative_ttl
+        self.budget = budget
+        self.flight = SingleFlight()
+        self.dirty = False
+
+    async def resolve(self, name: str) -> str:
+        """Returns SUBREDDIT, REDDITOR or MISSING for the given name."""
+        key = name.lower()
+        if (kind := self.cache.get(key)) is not None:
+            return kind
+        return await self.flight.do(key, lambda: self.lookup(key))
+
+    async def lookup(self, name: str) -> str:
+        """Asks Reddit what the name is and caches the answer."""
+        if await self.is_subreddit(name):
+            kind = SUBREDDIT
+        elif await self.is_redditor(name):
+            kind = REDDITOR
+        else:
+            kind = MISSING
+        self.cache.set(name, kind, ttl=self.negative_ttl if kind == MISSING else None)
+        self.dirty = True
+        return kind
+
+    async def is_subreddit(self, name: str) -> bool:
+        """Checks if a subreddit exists."""
+        if self.budget:
+            await self.budget.acquire(INTERACTIVE)
+        try:
+            _ = [
+                sub
+                async for sub in self.reddit.subreddits.search_by_name(
+                    query=name, exact=True
+                )
+            ]
+        except (asyncprawcore.NotFound, asyncprawcore.exceptions.Redirect):
+            return False
+        return True
+
+    async def is_redditor(self, name: str) -> bool:
+        """Checks if a redditor exists."""
+        if self.budget:
+            await self.budget.acquire(INTERACTIVE)
+        try:
+            await self.reddit.redditor(name, fetch=True)
+        except (asyncprawcore.NotFound, asyncprawcore.exceptions.Redirect):
+            return False
+        return True
+
+    def dump(self) -> Dict[str, Tuple[float, str]]:
+        """Returns the cached answers in a json serializable form."""
+        self.dirty = False
+        return self.cache.dump()
+
+    def load(self, entries: Dict[str, Tuple[float, str]]) -> None:
+        """Restores answers returned by dump."""
+        self.cache.load(entries)
+
+
+class SeenSet:
+    """Remembers the newest submission ids delivered for each subreddit.
+
+    Each subreddit keeps a ring of its newest ring_size base36 ids, sorted so
+    the smallest id is dropped when it is full whatever order ids arrive in,
+    and at most max_subreddits rings are kept, least recently used first out.
+    Ids older than a subreddit's oldest remembered id count as seen, which
+    keeps restarts from delivering old posts that fell out of the ring.
+    """
+
+    def __init__(
+        self, ring_size: Optional[int] = 50, max_subreddits: Optional[int] = 20000
+    ) -> None:
+        """Init method."""
+        self.ring_size = ring_size
+        self.max_subreddits = max_subreddits
+        self.rings: "OrderedDict[str, List[str]]" = OrderedDict()
+        self.dirty = False
+        self.added = 0
+        self.duplicates = 0
+
+    def __len__(self) -> int:
+        """Number of remembered ids."""
+        return sum(len(ring) for ring in self.rings.values())
+
+    def knows(self, subreddit: str) -> bool:
+        """Checks if any id of the subreddit is remembered."""
+        return subreddit in self.rings
+
+    def seen(self, subreddit: str, submission_id: str) -> bool:
+        """Checks if the submission was seen or is older than the ring."""
+        if not (ring := self.rings.get(subreddit)):
+            return False
+        return submission_id in ring or int(submission_id, 36) < int(ring[0], 36)
+
+    def add(self, subreddit: str, submission_id: str) -> bool:
+        """Remembers a submission, returning False if it was already seen."""
+        if self.seen(subreddit, submission_id):
+            self.duplicates += 1
+            return False
+        self.added += 1
+        if (ring := self.rings.get(subreddit)) is None:
+            ring = self.rings[subreddit] = []
+        ring.append(submission_id)
+        ring.sort(key=lambda seen_id: int(seen_id, 36))
+        del ring[: -self.ring_size]
+        self.rings.move_to_end(subreddit)
+        while len(self.rings) > self.max_subreddits:
+            self.rings.popitem(last=False)
+        self.dirty = True
+        return True
+
+    def dump(self) -> Dict[str, List[str]]:
+        """Returns the rings in a json serializable form."""
+        self.dirty = False
+        return {subreddit: list(ring) for subreddit, ring in self.rings.items()}
+
+    def load(self, rings: Dict[str, List[str]]) -> None:
+        """Restores rings returned by dump."""
+        for subreddit, ids in rings.items():
+            ring = sorted(ids, key=lambda seen_id: int(seen_id, 36))
+            self.rings[subreddit] = ring[-self.ring_size :]
+        while len(self.rings) > self.max_subreddits:
+            self.rings.popitem(last=False)
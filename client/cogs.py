@@ -1,19 +1,31 @@
 """Collection of discord cogs."""
+import asyncio
 import logging
+import os
+from typing import Optional, Set, Union
 
 from discord import Embed
 from discord.ext import tasks, commands
 
 from .bot import Bot
+from .caches import REDDITOR
+from .delivery import DeliveryScheduler
+from .index import compact
+from .metrics import Counter, Histogram, MetricsServer, Registry
 from .mixins import Reddit
+from .profiling import Profiler
+from .ratelimit import INTERACTIVE, STREAM
+from .streams import AdaptiveStreamManager, CatchUp, StreamManager
 from .utils import (
     create_table,
     create_discord_embed,
     format_input,
     format_exception,
     from_config,
-    EXCEPTIONS,
+    sort_option,
+    REDDITOR_SORTING_OPTIONS,
 )
+from .workers import SETTINGS, WorkerPool
 
 
 class RedditCommands(commands.Cog):
@@ -22,16 +34,193 @@ class RedditCommands(commands.Cog):
     def __init__(self, bot: Bot) -> None:
         """Init method."""
         self.bot = bot
+        processes = self.bot.config.WORKERS + 1 if self.bot.config.WORKERS else 1
+        request_rate = self.bot.config.REDDIT_REQUEST_RATE / processes
+        request_burst = max(1.0, self.bot.config.REDDIT_REQUEST_BURST / processes)
         self.reddit = Reddit(
             client_id=self.bot.config.REDDIT_CLIENT_ID,
             client_secret=self.bot.config.REDDIT_CLIENT_SECRET,
             filename=self.bot.config.FILENAME,
+            write_delay=self.bot.config.STORAGE_WRITE_DELAY,
+            storage_backend=self.bot.config.STORAGE_BACKEND,
+            database=self.bot.config.DATABASE,
+            author_cache_size=self.bot.config.AUTHOR_CACHE_SIZE,
+            author_cache_ttl=self.bot.config.AUTHOR_CACHE_TTL,
+            author_cache_negative_ttl=self.bot.config.AUTHOR_CACHE_NEGATIVE_TTL,
+            kinds_positive_ttl=self.bot.config.KINDS_POSITIVE_TTL,
+            kinds_negative_ttl=self.bot.config.KINDS_NEGATIVE_TTL,
+            render_cache_size=self.bot.config.RENDER_CACHE_SIZE,
+            render_executor_threshold=self.bot.config.RENDER_EXECUTOR_THRESHOLD,
+            seen_ring_size=self.bot.config.SEEN_RING_SIZE,
+            request_rate=request_rate,
+            request_burst=request_burst,
+            oauth_url=self.bot.config.REDDIT_OAUTH_URL,
+            reddit_url=self.bot.config.REDDIT_URL,
+            index_size=self.bot.config.INDEX_SIZE,
+            index_max_age=self.bot.config.INDEX_MAX_AGE,
+            recent_ring_size=self.bot.config.RECENT_RING_SIZE,
+            recent_max_age=self.bot.config.RECENT_MAX_AGE,
+            state_name=self.bot.config.PROCESS_NAME or None,
         )
+        self.delivery = DeliveryScheduler(
+            bot=self.bot,
+            maxsize=self.bot.config.DELIVERY_QUEUE_SIZE,
+            policy=self.bot.config.DELIVERY_QUEUE_POLICY,
+            batch_size=self.bot.config.DELIVERY_BATCH_SIZE,
+            global_rate=self.bot.config.DELIVERY_GLOBAL_RATE * self.bot.shard_share,
+            logger=logging.getLogger(self.bot.config.LOGFILENAME),
+        )
+        stream_options = {
+            "reddit": self.reddit.request,
+            "callback": self.deliver_submission,
+            "shard_size": self.bot.config.STREAM_SHARD_SIZE,
+            "seen": self.reddit.seen,
+            "logger": logging.getLogger(self.bot.config.LOGFILENAME),
+            "budget": self.reddit.budget,
+            "max_backoff": self.bot.config.STREAM_MAX_BACKOFF,
+            "failure_threshold": self.bot.config.STREAM_FAILURE_THRESHOLD,
+            "reset_timeout": self.bot.config.STREAM_RESET_TIMEOUT,
+            "recent": self.reddit.recent,
+        }
+        if self.bot.config.WORKERS:
+            settings = {key: getattr(self.bot.config, key) for key in SETTINGS}
+            settings["REDDIT_REQUEST_RATE"] = request_rate
+            settings["REDDIT_REQUEST_BURST"] = request_burst
+            self.streams = WorkerPool(
+                callback=self.deliver_embed,
+                settings=settings,
+                workers=self.bot.config.WORKERS,
+                address=(self.bot.config.WORKER_HOST, self.bot.config.WORKER_PORT),
+                authkey=self.bot.config.WORKER_AUTHKEY.encode("utf-8") or None,
+                seen=self.reddit.seen,
+                timeout=self.bot.config.WORKER_TIMEOUT,
+                logger=logging.getLogger(self.bot.config.LOGFILENAME),
+            )
+        elif self.bot.config.STREAM_ENGINE == "adaptive":
+            self.streams = AdaptiveStreamManager(
+                hot_interval=self.bot.config.STREAM_HOT_INTERVAL,
+                max_latency=self.bot.config.STREAM_MAX_LATENCY,
+                **stream_options,
+            )
+        else:
+            self.streams = StreamManager(**stream_options)
+        self.catch_up = CatchUp(
+            reddit=self.reddit.request,
+            callback=self.deliver_submission,
+            seen=self.reddit.seen,
+            max_age=self.bot.config.CATCH_UP_MAX_AGE,
+            max_posts=self.bot.config.CATCH_UP_MAX_POSTS,
+            group_size=self.bot.config.STREAM_SHARD_SIZE,
+            logger=logging.getLogger(self.bot.config.LOGFILENAME),
+            budget=self.reddit.budget,
+        )
+        self.embed_latency = Histogram(
+            "embed_build_seconds", "Time spent building a submission embed."
+        )
+        self.ingested = Counter(
+            "reddit_submissions_ingested_total", "New submissions read from Reddit."
+        )
+        self.metrics = self.create_metrics()
+        self.metrics_server = MetricsServer(
+            registry=self.metrics,
+            host=self.bot.config.METRICS_HOST,
+            port=self.bot.config.METRICS_PORT,
+        )
+        if self.bot.config.METRICS_PORT:
+            self.serve_metrics.start()
         self.fetch_subscriptions.start()
+        self.save_state.change_interval(seconds=self.bot.config.STATE_SAVE_INTERVAL)
+        self.save_state.start()
 
     def cog_unload(self) -> None:
         """Unload cog."""
         self.fetch_subscriptions.cancel()
+        self.save_state.cancel()
+        self.streams.close()
+        self.reddit.save()
+        self.reddit.storage.flush_now()
+        self.bot.loop.create_task(self.metrics_server.close())
+
+    async def close(self) -> None:
+        """Stop streaming and write pending changes before the bot disconnects."""
+        self.fetch_subscriptions.cancel()
+        self.save_state.cancel()
+        self.streams.close()
+        if wait_closed := getattr(self.streams, "wait_closed", None):
+            await wait_closed()
+        await self.delivery.close()
+        await self.reddit.close()
+        await self.metrics_server.close()
+
+    def create_metrics(self) -> Registry:
+        """Register the metrics of the ingest and delivery pipeline."""
+        registry = Registry()
+        seen, delivery = self.reddit.seen, self.delivery
+        registry.register(self.ingested)
+        registry.counter(
+            "reddit_submissions_repolled_total",
+            "Submissions polled again after they were already seen.",
+            lambda: seen.duplicates,
+        )
+        registry.counter(
+            "discord_embeds_delivered_total",
+            "Embeds sent to Discord.",
+            lambda: delivery.sent,
+        )
+        registry.counter(
+            "discord_embeds_dropped_total",
+            "Embeds dropped by full queues or failed sends.",
+            lambda: delivery.dropped,
+        )
+        registry.gauge(
+            "discord_queue_depth",
+            "Embeds waiting to be sent.",
+            lambda: delivery.depth,
+        )
+        registry.gauge(
+            "author_cache_hit_rate",
+            "Hit rate of the author cache.",
+            lambda: self.reddit.authors.cache.hit_rate,
+        )
+        registry.gauge(
+            "kinds_cache_hit_rate",
+            "Hit rate of the subreddit and redditor lookup cache.",
+            lambda: self.reddit.kinds.cache.hit_rate,
+        )
+        registry.gauge(
+            "render_cache_hit_rate",
+            "Hit rate of the description cache.",
+            lambda: self.reddit.renderer.cache.hit_rate,
+        )
+        registry.gauge(
+            "streams_active_subreddits",
+            "Subreddits being streamed.",
+            lambda: len(self.streams.assignments),
+        )
+        registry.gauge(
+            "streams_active_shards",
+            "Shards polling Reddit.",
+            lambda: len(self.streams.shards),
+        )
+        registry.gauge(
+            "search_index_submissions",
+            "Streamed submissions indexed for searches.",
+            lambda: len(self.reddit.index),
+        )
+        registry.counter(
+            "search_index_hits_total",
+            "Searches answered from the index.",
+            lambda: self.reddit.index.hits,
+        )
+        registry.counter(
+            "recent_posts_hits_total",
+            "Newest post fetches answered from the streamed posts.",
+            lambda: self.reddit.recent.hits,
+        )
+        registry.register(self.reddit.request_latency)
+        registry.register(self.embed_latency)
+        registry.register(delivery.send_latency)
+        return registry
 
     @commands.command(name="sub", help="Subscribe to a subreddit")
     @from_config(commands.has_any_role, "DISCORD_BOT_ADVANCED_COMMANDS_ROLES")
@@ -40,6 +229,7 @@ class RedditCommands(commands.Cog):
     ) -> None:
         """Add a subreddit to subscriptions."""
         commands.has_any_role()
+        await self.reddit.refresh_subscriptions()
         message = f"Subrredit {subreddit} has been subcribed!"
         if self.reddit.subreddit_is_banned(subreddit=subreddit):
             message = f"Subreddit {subreddit} is banned and cannot be subscribed to!"
@@ -51,7 +241,7 @@ class RedditCommands(commands.Cog):
             self.reddit.manage_subscription(
                 channel_id=ctx.channel.id,
                 subreddit=subreddit,
-                callback=self.fetch_subscriptions.restart,
+                callback=self.sync_streams,
             )
         else:
             message = f"Subreddit {subreddit} does not exist!"
@@ -70,13 +260,18 @@ class RedditCommands(commands.Cog):
                 channel_id=ctx.channel.id,
                 subreddit=subreddit,
                 subscribe=False,
-                callback=self.fetch_subscriptions.restart,
+                callback=self.sync_streams,
             )
         else:
             message = f"Subreddit {subreddit} is not subscribed!"
         await ctx.send(message)
 
-    @commands.command(name="fetch", help="Fetch new posts from a specified subreddit")
+    @commands.command(
+        name="fetch",
+        help="Fetch posts from a subreddit or redditor: [count] [sort] [search terms]. "
+        "A first search word that is a number or a sort is read as the count or "
+        "sort, put -- before the search terms to search for it.",
+    )
     @from_config(
         commands.has_any_role,
         "DISCORD_BOT_ADVANCED_COMMANDS_ROLES",
@@ -86,21 +281,49 @@ class RedditCommands(commands.Cog):
         self,
         ctx: commands.context.Context,
         subreddit_or_redditor: format_input,
+        count: Optional[int] = 1,
+        sort: Optional[sort_option] = None,
         *submission_name_args,
     ) -> None:
-        """Fetch a post from a subreddit and post to discord."""
+        """Fetch posts from a subreddit and post them to discord.
+        Embeds are built concurrently and sent in order, ten per message.
+        """
+        if submission_name_args[:1] == ("--",):
+            submission_name_args = submission_name_args[1:]
         async with ctx.typing():
-            search_kwargs = {"subreddit_or_redditor": subreddit_or_redditor}
+            search_kwargs = {
+                "subreddit_or_redditor": subreddit_or_redditor,
+                "sort": sort,
+                "limit": max(1, min(count, self.bot.config.FETCH_MAX_COUNT)),
+            }
             if submission_name_args:
                 search_kwargs["search_term"] = "+".join(submission_name_args)
             if self.reddit.subreddit_is_banned(subreddit=subreddit_or_redditor):
                 await ctx.send(
                     f"Subreddit {subreddit_or_redditor} is banned and cannot be fetched!"
                 )
+            elif sort and submission_name_args:
+                await ctx.send("Search results cannot be sorted!")
+            elif (
+                sort not in (None, *REDDITOR_SORTING_OPTIONS)
+                and await self.reddit.kinds.resolve(subreddit_or_redditor) == REDDITOR
+            ):
+                await ctx.send(f"Posts of redditors cannot be sorted by {sort}!")
             elif submissions := await self.reddit.fetch(**search_kwargs):
+                embeds = await asyncio.gather(
+                    *(
+                        create_discord_embed(
+                            sub,
+                            authors=self.reddit.authors,
+                            renderer=self.reddit.renderer,
+                            lane=INTERACTIVE,
+                        )
+                        for sub in submissions
+                    )
+                )
                 [
-                    await ctx.send(embed=await create_discord_embed(sub))
-                    async for sub in submissions
+                    await self.delivery.send(ctx.channel, embeds[index : index + 10])
+                    for index in range(0, len(embeds), 10)
                 ]
             else:
                 await ctx.send(f"No results found for {subreddit_or_redditor}!")
@@ -112,12 +335,15 @@ class RedditCommands(commands.Cog):
         "DISCORD_BOT_ADVANCED_COMMANDS_ROLES",
     )
     async def view_subbed(self, ctx: commands.context.Context) -> None:
-        """View the list of subscribed subreddits."""
+        """View the list of subscribed subreddits.
+        Channels of guilds run by other shard processes are left out.
+        """
         try:
             channels, subreddits = zip(
                 *(
-                    (self.bot.get_channel(channel_id).name, subreddit)
+                    (channel.name, subreddit)
                     for channel_id, subreddit in self.reddit.get_subscriptions()
+                    if (channel := self.bot.get_channel(channel_id))
                 )
             )
             table = create_table({"Channel": channels, "Subreddit": subreddits})
@@ -137,7 +363,7 @@ class RedditCommands(commands.Cog):
         self, ctx: commands.context.Context, subreddit: format_input
     ) -> None:
         message = f"Subreddit {subreddit} has been banned!"
-        self.reddit.manage_moderation(subreddit=subreddit)
+        self.reddit.manage_moderation(subreddit=subreddit, callback=self.sync_streams)
         await ctx.send(message)
 
     @commands.command(name="banned", help="List all banned subreddits")
@@ -147,7 +373,7 @@ class RedditCommands(commands.Cog):
         "DISCORD_BOT_NORMAL_COMMANDS_ROLES",
     )
     async def view_banned(self, ctx: commands.context.Context) -> None:
-        if banned := self.reddit.subreddits.get("banned", []):
+        if banned := sorted(self.reddit.subscriptions.banned):
             table = create_table({"Subreddits": banned})
             embed = Embed.from_dict(
                 {"title": "Banned Subreddits", "description": f"```\n{table}\n```"}
@@ -166,36 +392,247 @@ class RedditCommands(commands.Cog):
     ) -> None:
         message = f"Subreddit {subreddit} has been unbanned!"
         self.reddit.manage_moderation(
-            subreddit=subreddit, ban=False, callback=self.fetch_subscriptions.restart
+            subreddit=subreddit, ban=False, callback=self.sync_streams
         )
         await ctx.send(message)
 
-    @tasks.loop()
+    @commands.command(name="health", help="Show the health of the streams")
+    @from_config(commands.has_any_role, "DISCORD_BOT_ADVANCED_COMMANDS_ROLES")
+    async def view_health(self, ctx: commands.context.Context) -> None:
+        """View the breaker state of every stream shard."""
+        health = self.streams.health
+        if shards := health["shards"]:
+            table = create_table(
+                {
+                    "Shard": list(shards),
+                    "State": [shard["state"] for shard in shards.values()],
+                    "Subreddits": [shard["subreddits"] for shard in shards.values()],
+                    "Failures": [shard["failures"] for shard in shards.values()],
+                }
+            )
+            description = f"```\n{table}\n```"
+        else:
+            description = "No streams are running."
+        embed = Embed.from_dict(
+            {"title": f"Streams: {health['status']}", "description": description}
+        )
+        await ctx.send(embed=embed)
+
+    @commands.command(name="stats", help="Show the pipeline metrics")
+    @from_config(commands.has_any_role, "DISCORD_BOT_ADVANCED_COMMANDS_ROLES")
+    async def view_stats(self, ctx: commands.context.Context) -> None:
+        """View a summary of the metrics served to Prometheus."""
+        summary = self.metrics.summary()
+        table = create_table(
+            {
+                "Metric": list(summary),
+                "Value": [
+                    f"{value['mean'] * 1000:.1f}ms avg, "
+                    f"{value['p95'] * 1000:.0f}ms p95, {value['count']} calls"
+                    if isinstance(value, dict)
+                    else round(value, 3)
+                    for value in summary.values()
+                ],
+            },
+            tablefmt="simple",
+        )
+        embed = Embed.from_dict(
+            {"title": "Pipeline Stats", "description": f"```\n{table}\n```"}
+        )
+        await ctx.send(embed=embed)
+
+    @commands.command(name="budget", help="Show the Reddit request budget")
+    @from_config(commands.has_any_role, "DISCORD_BOT_ADVANCED_COMMANDS_ROLES")
+    async def view_budget(self, ctx: commands.context.Context) -> None:
+        """View the Reddit quota left and the requests made by each lane."""
+        state = self.reddit.budget.state
+        table = create_table(
+            {
+                "Lane": list(state["granted"]),
+                "Granted": list(state["granted"].values()),
+                "Waiting": list(state["waiting"].values()),
+            }
+        )
+        embed = Embed.from_dict(
+            {
+                "title": "Reddit Request Budget",
+                "description": (
+                    f"Remaining: {state['remaining']}, used: {state['used']}, "
+                    f"reset in: {state['reset_in']}s, tokens: {state['tokens']}"
+                    f"\n```\n{table}\n```"
+                ),
+            }
+        )
+        await ctx.send(embed=embed)
+
+    async def deliver_submission(self, submission) -> None:
+        """Build the embed once and queue it for every subscribed channel."""
+        subreddit = submission.subreddit.display_name.lower()
+        self.reddit.index.add(compact(submission))
+        embed = None
+        if self.reddit.get_channels(subreddit=subreddit):
+            with self.embed_latency.time():
+                embed = await create_discord_embed(
+                    submission,
+                    authors=self.reddit.authors,
+                    renderer=self.reddit.renderer,
+                    lane=STREAM,
+                )
+        self.deliver_embed(
+            subreddit=subreddit,
+            submission_id=submission.id,
+            created=submission.created_utc,
+            embed=embed,
+        )
+
+    def deliver_embed(
+        self,
+        subreddit: str,
+        submission_id: str,
+        created: float,
+        embed: Optional[Union[Embed, dict]],
+        record: Optional[dict] = None,
+    ) -> None:
+        """Queue an embed, or one rendered by a worker, for every subscribed channel.
+        The cursor of the subreddit only moves once a channel took the embed.
+        """
+        self.ingested.inc()
+        if record is not None:
+            self.reddit.index.add(record)
+        if embed is not None and (
+            channels := [
+                channel
+                for channel_id in self.reddit.get_channels(subreddit=subreddit)
+                if (channel := self.bot.get_channel(channel_id))
+            ]
+        ):
+            if isinstance(embed, dict):
+                embed = Embed.from_dict(embed)
+            [self.delivery.submit(channel=channel, embed=embed) for channel in channels]
+            self.reddit.mark_delivered(
+                subreddit=subreddit, submission_id=submission_id, created=created
+            )
+
+    def streamed_subreddits(self) -> Set[str]:
+        """Subscribed subreddits, limited to the guilds of this process when sharded."""
+        subreddits = self.reddit.subscriptions.subreddits()
+        if not self.bot.sharded:
+            return subreddits
+        return {
+            subreddit
+            for subreddit in subreddits
+            if any(
+                self.bot.get_channel(channel_id)
+                for channel_id in self.reddit.get_channels(subreddit=subreddit)
+            )
+        }
+
+    def sync_streams(self, resume: bool = False) -> None:
+        """Apply subscription changes to the running streams.
+        Streams only start after READY, on the first run of fetch_subscriptions.
+        """
+        if not self.bot.is_ready():
+            return
+        self.streams.sync(self.streamed_subreddits(), resume=resume)
+
+    @tasks.loop(minutes=5)
     async def fetch_subscriptions(self) -> None:
-        """Fetch submissions from subscribed subreddits."""
-        if subreddits := {
-            subreddit: channel_id
-            for channel_id, subreddit in self.reddit.get_subscriptions()
-        }:
-            subscribed = await self.reddit.request.subreddit(
-                "+".join(subreddits.keys())
+        """Reconcile the streamed subreddits with the stored subscriptions.
+        The first run catches up on missed posts, then resumes live streaming.
+        Later runs pick up the changes other processes made to a shared storage.
+        """
+        await self.reddit.refresh_subscriptions()
+        if resume := self.fetch_subscriptions.current_loop == 0:
+            subreddits = self.streamed_subreddits()
+            await self.catch_up.run(
+                {
+                    subreddit: cursor
+                    for subreddit, cursor in self.reddit.cursors.items()
+                    if subreddit in subreddits
+                }
             )
-            try:
-                async for submission in subscribed.stream.submissions(
-                    skip_existing=True
-                ):
-                    subreddit = submission.subreddit.display_name
-                    channel_id = subreddits.get(subreddit)
-                    if channel := self.bot.get_channel(channel_id):
-                        async with channel.typing():
-                            await channel.send(
-                                embed=await create_discord_embed(submission)
-                            )
-            except (Exception, *EXCEPTIONS) as error:
-                if error not in EXCEPTIONS:
-                    logger = logging.getLogger(self.bot.config.LOGFILENAME)
-                    logger.error(format_exception(error=error))
-                self.fetch_subscriptions.restart()
+        self.sync_streams(resume=resume)
+
+    @fetch_subscriptions.before_loop
+    async def wait_for_guilds(self) -> None:
+        """Wait for READY, as no channel can be resolved before it.
+        Caught up and resumed posts would otherwise all be dropped.
+        """
+        await self.bot.wait_until_ready()
+
+    @tasks.loop(count=1)
+    async def serve_metrics(self) -> None:
+        """Start serving the metrics once the bot is running."""
+        try:
+            await self.metrics_server.start()
+        except OSError as error:
+            logger = logging.getLogger(self.bot.config.LOGFILENAME)
+            logger.error(format_exception(error=error))
+
+    @tasks.loop(seconds=15)
+    async def save_state(self) -> None:
+        """Periodically save cached state that should survive restarts."""
+        self.reddit.save()
+
+
+class ProfilingCommands(commands.Cog):
+    """Profiling of the running bot."""
+
+    def __init__(self, bot: Bot) -> None:
+        """Init method."""
+        self.bot = bot
+        self.profiler = Profiler(
+            bot=self.bot,
+            directory=os.path.join(self.bot.config.BASE_DIR, "logs"),
+            interval=self.bot.config.PROFILE_INTERVAL,
+            slow_callback=self.bot.config.PROFILE_SLOW_CALLBACK,
+        )
+        if self.bot.config.PROFILING:
+            self.start_profiling.start()
+
+    def cog_unload(self) -> None:
+        """Unload cog."""
+        self.profiler.stop()
+
+    async def close(self) -> None:
+        """Write the results of a profile still running."""
+        self.profiler.stop()
+
+    @tasks.loop(count=1)
+    async def start_profiling(self) -> None:
+        """Start profiling as soon as the bot runs."""
+        self.profiler.start()
+
+    @commands.command(name="profile", help="Start, stop or check profiling")
+    @from_config(commands.has_any_role, "DISCORD_BOT_ADVANCED_COMMANDS_ROLES")
+    async def profile(
+        self, ctx: commands.context.Context, action: str = "status"
+    ) -> None:
+        """Toggle profiling, reporting the results when it stops."""
+        if action == "start":
+            self.profiler.start()
+            message = "Profiling started!"
+        elif action == "stop" and self.profiler.running:
+            summary = self.profiler.stop()
+            message = (
+                f"Profiling stopped after {summary['duration']:.0f}s, "
+                f"max loop lag {summary['max_lag'] * 1000:.0f}ms. "
+                f"Results written to {', '.join(map(os.path.basename, summary['files']))}"
+            )
+        elif self.profiler.running:
+            summary = self.profiler.summary()
+            slowest = summary["slow_callbacks"][:3]
+            message = (
+                f"Profiling for {summary['duration']:.0f}s, "
+                f"max loop lag {summary['max_lag'] * 1000:.0f}ms"
+                + "".join(
+                    f"\n{label}: {longest * 1000:.0f}ms"
+                    for label, _, _, longest in slowest
+                )
+            )
+        else:
+            message = "Profiling is off."
+        await ctx.send(message)
 
 
 class CommandsErrorHandler(commands.Cog):
@@ -224,5 +661,11 @@ class CommandsErrorHandler(commands.Cog):
             message = "Something about your input was wrong, please check your input and try again!"
 
         logger = logging.getLogger(self.bot.config.LOGFILENAME)
-        logger.error(format_exception(error=error))
+        logger.error(
+            format_exception(error=error),
+            extra={
+                "channel_id": ctx.channel.id,
+                "guild_id": ctx.guild.id if ctx.guild else None,
+            },
+        )
         await ctx.send(message)
@@ -0,0 +1,40 @@
+"""Collection of html conversion helpers.
+
+Kept apart from the renderer so html2text is only imported once a description
+is rendered.
+"""
+from typing import Optional
+
+import html2text
+
+
+class Converter(html2text.HTML2Text):
+    """An html2text converter that can be reused and stop early."""
+
+    def __init__(self, ignore_links: Optional[bool] = True) -> None:
+        """Init method."""
+        self.ignore_links_option = ignore_links
+        self.reset_converter()
+
+    def reset_converter(self) -> None:
+        """Clears the state left behind by the previous conversion."""
+        html2text.HTML2Text.__init__(self)
+        self.ignore_links = self.ignore_links_option
+        self.produced = 0
+
+    def outtextf(self, s: str) -> None:
+        """Collects output while counting how much was produced."""
+        super().outtextf(s)
+        self.produced += len(s)
+
+    def convert(
+        self, html: str, limit: Optional[int] = None, chunk_size: int = 1024
+    ) -> str:
+        """Converts html to text, stopping once about limit characters exist."""
+        self.reset_converter()
+        for start in range(0, len(html), chunk_size):
+            self.feed(html[start : start + chunk_size])
+            if limit is not None and self.produced >= limit:
+                break
+        self.feed("")
+        return self.optwrap(self.finish())
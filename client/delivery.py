@@ -0,0 +1,193 @@
+"""Collection of discord delivery helpers."""
+import asyncio
+import inspect
+import logging
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from discord import Embed
+from discord.abc import Messageable
+from discord.ext import commands
+from discord.http import Route
+
+from client.metrics import Histogram
+from client.ratelimit import TokenBucket
+from client.utils import format_exception
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+MERGE = "merge"
+POLICIES = (DROP_OLDEST, DROP_NEWEST, MERGE)
+
+SUPPORTS_EMBEDS = "embeds" in inspect.signature(Messageable.send).parameters
+
+
+class ChannelQueue:
+    """Bounded queue of the embeds waiting to be sent to a channel.
+
+    When the queue is full the policy decides what happens to a new embed:
+    drop_oldest makes room for it, drop_newest discards it and merge folds the
+    oldest embed into a summary of links sent as the next message.
+    """
+
+    def __init__(
+        self,
+        channel: Messageable,
+        maxsize: Optional[int] = 100,
+        policy: Optional[str] = DROP_OLDEST,
+        rate: Optional[float] = 1,
+        burst: Optional[float] = 5,
+    ) -> None:
+        """Init method."""
+        if policy not in POLICIES:
+            raise ValueError(f"Invalid queue policy: {policy}")
+        self.channel = channel
+        self.maxsize = maxsize
+        self.policy = policy
+        self.embeds: Deque[Embed] = deque()
+        self.merged: List[Embed] = []
+        self.bucket = TokenBucket(rate=rate, capacity=burst)
+        self.dropped = 0
+        self.task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        """Number of messages worth of embeds waiting."""
+        return len(self.embeds) + bool(self.merged)
+
+    def put(self, embed: Embed) -> None:
+        """Queues an embed, applying the policy when full."""
+        if len(self.embeds) >= self.maxsize:
+            if self.policy == DROP_NEWEST:
+                self.dropped += 1
+                return
+            oldest = self.embeds.popleft()
+            if self.policy == MERGE and len(self.merged) < self.maxsize:
+                self.merged.append(oldest)
+            else:
+                self.dropped += 1
+        self.embeds.append(embed)
+
+    def take(self, count: int) -> List[Embed]:
+        """Removes up to count embeds, or the merged summary on its own.
+        The summary can nearly fill the 6000 characters Discord allows per message.
+        """
+        if self.merged:
+            return [self.summary()]
+        embeds = []
+        while self.embeds and len(embeds) < count:
+            embeds.append(self.embeds.popleft())
+        return embeds
+
+    def summary(self, max_length: Optional[int] = 4096) -> Embed:
+        """Folds the merged embeds into a single embed of links."""
+        lines = [f"[{embed.title}]({embed.url})" for embed in self.merged]
+        description = "\n".join(lines)
+        if len(description) > max_length:
+            description = f"{description[:max_length - 3]}..."
+        embed = Embed(title=f"{len(lines)} more posts", description=description)
+        self.merged = []
+        return embed
+
+
+class DeliveryScheduler:
+    """Sends embeds to channels without letting one channel hold up the others.
+
+    Each channel has its own queue, drained by its own task while it has work.
+    Sends respect a per channel bucket and a global bucket shared by all
+    channels. A channel that falls behind gets up to batch_size embeds packed
+    into each message.
+    """
+
+    def __init__(
+        self,
+        bot: commands.Bot,
+        maxsize: Optional[int] = 100,
+        policy: Optional[str] = DROP_OLDEST,
+        batch_size: Optional[int] = 10,
+        global_rate: Optional[float] = 50,
+        channel_rate: Optional[float] = 1,
+        channel_burst: Optional[float] = 5,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        """Init method."""
+        self.bot = bot
+        self.maxsize = maxsize
+        self.policy = policy
+        self.batch_size = min(batch_size, 10)
+        self.bucket = TokenBucket(rate=global_rate)
+        self.channel_rate = channel_rate
+        self.channel_burst = channel_burst
+        self.logger = logger or logging.getLogger(__name__)
+        self.queues: Dict[int, ChannelQueue] = {}
+        self.sent = 0
+        self.send_latency = Histogram(
+            "discord_send_seconds", "Latency of the messages sent to Discord."
+        )
+
+    @property
+    def depth(self) -> int:
+        """Number of embeds waiting across every channel."""
+        return sum(len(queue.embeds) for queue in self.queues.values())
+
+    @property
+    def dropped(self) -> int:
+        """Number of embeds dropped across every channel."""
+        return sum(queue.dropped for queue in self.queues.values())
+
+    def submit(self, channel: Messageable, embed: Embed) -> None:
+        """Queues an embed for a channel and makes sure it is being drained."""
+        if (queue := self.queues.get(channel.id)) is None:
+            queue = self.queues[channel.id] = ChannelQueue(
+                channel=channel,
+                maxsize=self.maxsize,
+                policy=self.policy,
+                rate=self.channel_rate,
+                burst=self.channel_burst,
+            )
+        queue.put(embed)
+        if queue.task is None:
+            queue.task = asyncio.create_task(
+                self.drain(queue), name=f"deliver-{channel.id}"
+            )
+
+    async def drain(self, queue: ChannelQueue) -> None:
+        """Sends the queued embeds of a channel until none are left.
+        Embeds that fail to send are counted as dropped and draining goes on.
+        """
+        try:
+            while queue:
+                await queue.bucket.acquire()
+                await self.bucket.acquire()
+                embeds = queue.take(self.batch_size if len(queue) > 1 else 1)
+                try:
+                    with self.send_latency.time():
+                        await self.send(queue.channel, embeds)
+                    self.sent += len(embeds)
+                except Exception as error:
+                    queue.dropped += len(embeds)
+                    self.logger.error(
+                        format_exception(error=error),
+                        extra={"channel_id": queue.channel.id},
+                    )
+        finally:
+            queue.task = None
+
+    async def send(self, channel: Messageable, embeds: List[Embed]) -> None:
+        """Sends one message holding the given embeds."""
+        if len(embeds) == 1:
+            await channel.send(embed=embeds[0])
+        elif SUPPORTS_EMBEDS:
+            await channel.send(embeds=embeds)
+        else:
+            await self.bot.http.request(
+                Route("POST", "/channels/{channel_id}/messages", channel_id=channel.id),
+                json={"embeds": [embed.to_dict() for embed in embeds]},
+            )
+
+    async def close(self) -> None:
+        """Stops draining, dropping whatever is still queued."""
+        tasks = [queue.task for queue in self.queues.values() if queue.task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.queues = {}
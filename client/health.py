@@ -0,0 +1,105 @@
+"""Collection of failure handling helpers."""
+import random
+import time
+from typing import Callable, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+HEALTHY = "healthy"
+DEGRADED = "degraded"
+DOWN = "down"
+
+
+class Backoff:
+    """Exponential backoff with jitter.
+
+    Each failure doubles the ceiling up to maximum, and the delay is drawn from
+    the upper half of it so retries of many callers spread out over time.
+    """
+
+    def __init__(
+        self,
+        base: Optional[float] = 1,
+        maximum: Optional[float] = 300,
+        rng: Optional[random.Random] = None,
+    ) -> None:
+        """Init method."""
+        self.base = base
+        self.maximum = maximum
+        self.rng = rng or random.Random()
+        self.attempts = 0
+
+    def next(self) -> float:
+        """Seconds to wait before the next attempt."""
+        ceiling = min(self.maximum, self.base * 2**self.attempts)
+        self.attempts += 1
+        return ceiling / 2 + self.rng.uniform(0, ceiling / 2)
+
+    def reset(self) -> None:
+        """Starts over after a success."""
+        self.attempts = 0
+
+
+class CircuitBreaker:
+    """Stops calls to a failing dependency and probes it before trusting it again.
+
+    After failure_threshold consecutive failures the breaker opens and refuses
+    calls for about reset_timeout seconds, jittered so breakers that opened
+    together do not probe together. It then lets one call through half open:
+    a success closes it, a failure opens it again.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: Optional[int] = 5,
+        reset_timeout: Optional[float] = 60,
+        jitter: Optional[float] = 0.2,
+        clock: Optional[Callable[[], float]] = time.monotonic,
+        rng: Optional[random.Random] = None,
+    ) -> None:
+        """Init method."""
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.jitter = jitter
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.retry_at: Optional[float] = None
+
+    def allow(self) -> bool:
+        """Checks if a call may be made, moving from open to half open in time."""
+        if self.state == OPEN and self.clock() >= self.retry_at:
+            self.state = HALF_OPEN
+        return self.state != OPEN
+
+    def remaining(self) -> float:
+        """Seconds until an open breaker lets a probe through."""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.retry_at - self.clock())
+
+    def record_success(self) -> bool:
+        """Closes the breaker, returning whether it was not closed before."""
+        changed = self.state != CLOSED
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = self.retry_at = None
+        return changed
+
+    def record_failure(self) -> bool:
+        """Counts a failure, returning whether it opened the breaker."""
+        self.failures += 1
+        if self.state == HALF_OPEN or (
+            self.state == CLOSED and self.failures >= self.failure_threshold
+        ):
+            self.state = OPEN
+            self.opened_at = self.clock()
+            self.retry_at = self.opened_at + self.reset_timeout * (
+                1 + self.rng.uniform(0, self.jitter)
+            )
+            return True
+        return False
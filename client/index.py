@@ -0,0 +1,226 @@
+"""Collection of indexes over streamed submissions."""
+import re
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Set
+
+import asyncpraw
+from asyncpraw.models import Submission
+
+TOKEN = re.compile(r"[a-z0-9]+")
+RECORD_FIELDS = ("id", "title", "created", "created_utc", "edited")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase words of a text."""
+    return TOKEN.findall(text.lower())
+
+
+def phrase(query: str) -> List[str]:
+    """The words of a "+" joined search query, in order.
+    Empty when any word holds characters the index drops, such as "c++" or "c#",
+    since the index could not tell such a query apart from a plainer one.
+    """
+    words = []
+    for word in query.lower().split("+"):
+        tokens = tokenize(word)
+        if not tokens or " ".join(tokens) != " ".join(word.split()):
+            return []
+        words.extend(tokens)
+    return words
+
+
+def compact(submission: Submission, max_html: Optional[int] = 4096) -> Dict[str, Any]:
+    """The fields of a submission needed to rebuild its embed.
+    Long descriptions are cut, only their beginning is ever rendered. Deleted
+    authors are stored the way Reddit sends them, which rebuilds them as None.
+    """
+    record = {field: getattr(submission, field, None) for field in RECORD_FIELDS}
+    record["subreddit"] = submission.subreddit.display_name.lower()
+    record["author"] = submission.author.name if submission.author else "[deleted]"
+    if html := getattr(submission, "selftext_html", None):
+        record["selftext_html"] = html[:max_html]
+    return record
+
+
+def expand(reddit: asyncpraw.Reddit, record: Dict[str, Any]) -> Submission:
+    """Rebuilds a submission from a compact record without fetching it."""
+    data = dict(record)
+    if data.get("author") is None:
+        data["author"] = "[deleted]"
+    return Submission(reddit, _data=data)
+
+
+class TitleIndex:
+    """Inverted index over the titles of recently streamed submissions.
+
+    Holds at most maxsize records younger than max_age seconds, evicting the
+    earliest indexed first. A search only matches titles containing the query as a
+    phrase, newer posts first.
+    """
+
+    def __init__(
+        self,
+        maxsize: Optional[int] = 10000,
+        max_age: Optional[float] = 604800,
+        clock: Optional[Callable[[], float]] = time.time,
+    ) -> None:
+        """Init method."""
+        self.maxsize = maxsize
+        self.max_age = max_age
+        self.clock = clock
+        self.records: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.postings: Dict[str, Set[str]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        """Number of indexed submissions."""
+        return len(self.records)
+
+    def add(self, record: Dict[str, Any]) -> None:
+        """Indexes a compact submission record."""
+        if record["id"] in self.records or not record.get("title"):
+            return
+        self.records[record["id"]] = record
+        for token in set(tokenize(record["title"])):
+            self.postings.setdefault(token, set()).add(record["id"])
+        self.evict()
+
+    def remove(self, submission_id: str) -> None:
+        """Drops a submission from the index."""
+        if (record := self.records.pop(submission_id, None)) is None:
+            return
+        for token in set(tokenize(record["title"])):
+            if postings := self.postings.get(token):
+                postings.discard(submission_id)
+                if not postings:
+                    del self.postings[token]
+
+    def evict(self) -> None:
+        """Drops the oldest records beyond the size or age bounds."""
+        oldest = self.clock() - self.max_age
+        while self.records:
+            submission_id, record = next(iter(self.records.items()))
+            if len(self.records) <= self.maxsize and record["created_utc"] >= oldest:
+                break
+            self.remove(submission_id)
+
+    def search(
+        self, subreddit: str, query: str, limit: Optional[int] = 1
+    ) -> List[Dict[str, Any]]:
+        """Up to limit records of a subreddit matching the query, newest first.
+        Returns nothing unless limit records match, so callers can fall back.
+        """
+        self.evict()
+        words = phrase(query)
+        postings = sorted(
+            (self.postings.get(token, set()) for token in set(words)), key=len
+        )
+        if not postings or not postings[0]:
+            self.misses += 1
+            return []
+        size = len(words)
+        subreddit = subreddit.lower()
+        matches = [
+            record
+            for submission_id in set.intersection(*postings)
+            if (record := self.records[submission_id])["subreddit"] == subreddit
+            and any(
+                title[start : start + size] == words
+                for title in [tokenize(record["title"])]
+                for start in range(len(title) - size + 1)
+            )
+        ]
+        if len(matches) < limit:
+            self.misses += 1
+            return []
+        self.hits += 1
+        matches.sort(key=lambda record: record["created_utc"], reverse=True)
+        return matches[:limit]
+
+
+class RecentPosts:
+    """The newest posts of every streamed subreddit, as compact records.
+
+    Each subreddit keeps a ring of its ring_size newest records, newest first,
+    along with when its stream last polled successfully. A ring is only trusted
+    while that poll is less than max_age seconds old, as a stream that stopped
+    polling may have missed newer posts. At most max_subreddits rings are kept,
+    dropping the least recently updated.
+    """
+
+    def __init__(
+        self,
+        ring_size: Optional[int] = 10,
+        max_age: Optional[float] = 120,
+        max_subreddits: Optional[int] = 20000,
+        clock: Optional[Callable[[], float]] = time.time,
+    ) -> None:
+        """Init method."""
+        self.ring_size = ring_size
+        self.max_age = max_age
+        self.max_subreddits = max_subreddits
+        self.clock = clock
+        self.rings: "OrderedDict[str, Deque[Dict[str, Any]]]" = OrderedDict()
+        self.checked: Dict[str, float] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        """Number of records held."""
+        return sum(len(ring) for ring in self.rings.values())
+
+    def add(self, record: Dict[str, Any]) -> None:
+        """Keeps a record if it is among the newest of its subreddit."""
+        subreddit = record["subreddit"]
+        if (ring := self.rings.get(subreddit)) is None:
+            ring = self.rings[subreddit] = deque(maxlen=self.ring_size)
+        self.rings.move_to_end(subreddit)
+        while len(self.rings) > self.max_subreddits:
+            dropped, _ = self.rings.popitem(last=False)
+            self.checked.pop(dropped, None)
+        if any(kept["id"] == record["id"] for kept in ring):
+            return
+        index = next(
+            (
+                position
+                for position, kept in enumerate(ring)
+                if kept["created_utc"] <= record["created_utc"]
+            ),
+            len(ring),
+        )
+        if index >= self.ring_size:
+            return
+        if len(ring) == self.ring_size:
+            ring.pop()
+        ring.insert(index, record)
+
+    def touch(self, subreddits: Iterable[str]) -> None:
+        """Records a successful poll of the subreddits."""
+        now = self.clock()
+        for subreddit in subreddits:
+            if subreddit in self.rings:
+                self.checked[subreddit] = now
+
+    def forget(self, subreddit: str) -> None:
+        """Drops the ring of a subreddit."""
+        self.rings.pop(subreddit, None)
+        self.checked.pop(subreddit, None)
+
+    def newest(self, subreddit: str, limit: Optional[int] = 1) -> List[Dict[str, Any]]:
+        """The limit newest records of a subreddit, newest first.
+        Returns nothing unless the ring is fresh and holds limit records.
+        """
+        subreddit = subreddit.lower()
+        ring = self.rings.get(subreddit, ())
+        checked = self.checked.get(subreddit)
+        if (
+            len(ring) < limit
+            or checked is None
+            or self.clock() - checked > self.max_age
+        ):
+            self.misses += 1
+            return []
+        self.hits += 1
+        return list(ring)[:limit]
@@ -0,0 +1,158 @@
+"""Collection of logging helpers.
+
+Log calls only put records on a queue, a listener thread formats and writes
+them to a rotating file so the event loop never waits on the disk.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import time
+from logging.handlers import (
+    QueueHandler,
+    QueueListener,
+    RotatingFileHandler,
+    TimedRotatingFileHandler,
+)
+from typing import Callable, Dict, Optional, Tuple
+
+CONTEXT = ("subreddit", "submission_id", "channel_id", "guild_id", "shard")
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as json lines, with the ids passed in extra."""
+
+    def __init__(self, name: Optional[str] = None) -> None:
+        """Init method."""
+        super().__init__()
+        self.name = name
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Format a record as a single json object."""
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "message": record.getMessage(),
+        }
+        if self.name:
+            entry["process"] = self.name
+        entry.update(
+            (key, value)
+            for key in CONTEXT
+            if (value := getattr(record, key, None)) is not None
+        )
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DuplicateFilter(logging.Filter):
+    """Suppresses repeats of the same warning or error.
+
+    Up to burst records with the same first and last line pass every interval
+    seconds, the rest are dropped and counted. The next record let through
+    reports how many were suppressed.
+    """
+
+    def __init__(
+        self,
+        interval: Optional[float] = 60,
+        burst: Optional[int] = 3,
+        level: Optional[int] = logging.WARNING,
+        clock: Optional[Callable[[], float]] = time.monotonic,
+    ) -> None:
+        """Init method."""
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.level = level
+        self.clock = clock
+        self.windows: Dict[Tuple, list] = {}
+
+    def key(self, record: logging.LogRecord) -> Tuple:
+        """What makes two records duplicates of each other."""
+        lines = str(record.msg).strip().splitlines() or [""]
+        return record.name, record.levelno, lines[0], lines[-1]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Lets a record through unless it repeats too often."""
+        if record.levelno < self.level or not self.interval:
+            return True
+        now = self.clock()
+        if len(self.windows) > 1000:
+            self.windows = {
+                key: window
+                for key, window in self.windows.items()
+                if now - window[0] < self.interval
+            }
+        window = self.windows.setdefault(self.key(record), [now, 0, 0])
+        if now - window[0] >= self.interval:
+            window[0], window[1] = now, 0
+        if window[1] >= self.burst:
+            window[2] += 1
+            return False
+        window[1] += 1
+        if suppressed := window[2]:
+            window[2] = 0
+            record.msg = f"{record.msg}\n({suppressed} similar messages suppressed)"
+        return True
+
+
+def create_file_handler(
+    filename: str,
+    max_bytes: Optional[int] = 10 * 1024 * 1024,
+    backup_count: Optional[int] = 5,
+    when: Optional[str] = None,
+) -> logging.Handler:
+    """Rotating file handler, rotated by time when given when, by size otherwise."""
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    if when:
+        return TimedRotatingFileHandler(
+            filename, when=when, backupCount=backup_count, encoding="utf-8"
+        )
+    return RotatingFileHandler(
+        filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+    )
+
+
+def setup_logging(
+    filename: str,
+    name: Optional[str] = None,
+    level: Optional[str] = "INFO",
+    max_bytes: Optional[int] = 10 * 1024 * 1024,
+    backup_count: Optional[int] = 5,
+    when: Optional[str] = None,
+    structured: Optional[bool] = False,
+    duplicate_interval: Optional[float] = 60,
+    duplicate_burst: Optional[int] = 3,
+) -> QueueListener:
+    """Routes the root logger through a queue to a rotating file.
+    The name of a worker or shard process is written with each record.
+    """
+    handler = create_file_handler(
+        filename, max_bytes=max_bytes, backup_count=backup_count, when=when
+    )
+    origin = f"{name}.%(module)s" if name else "%(module)s"
+    handler.setFormatter(
+        JsonFormatter(name=name)
+        if structured
+        else logging.Formatter(f"[%(asctime)s] %(levelname)s in {origin}: %(message)s")
+    )
+    records = queue.SimpleQueue()
+    queue_handler = QueueHandler(records)
+    queue_handler.addFilter(
+        DuplicateFilter(interval=duplicate_interval, burst=duplicate_burst)
+    )
+    root = logging.getLogger()
+    root.setLevel(level)
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+        existing.close()
+    root.addHandler(queue_handler)
+    listener = QueueListener(records, handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
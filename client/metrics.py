@@ -0,0 +1,234 @@
+"""Collection of metrics helpers."""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Union
+
+from aiohttp import web
+from asyncprawcore import Requestor
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Metric:
+    """Base class of the metrics, read either from a value or a function.
+
+    Reading through a function keeps counting where it already happens, so
+    components pay nothing extra on their hot path.
+    """
+
+    kind = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        function: Optional[Callable[[], float]] = None,
+    ) -> None:
+        """Init method."""
+        self.name = name
+        self.description = description
+        self.function = function
+        self._value = 0.0
+
+    @property
+    def value(self) -> float:
+        """The current value."""
+        return self.function() if self.function else self._value
+
+    def samples(self) -> List[str]:
+        """Lines of the metric in the Prometheus text format."""
+        return [f"{self.name} {self.value}"]
+
+    def render(self) -> str:
+        """The metric in the Prometheus text format."""
+        return "\n".join(
+            [
+                f"# HELP {self.name} {self.description}",
+                f"# TYPE {self.name} {self.kind}",
+                *self.samples(),
+            ]
+        )
+
+
+class Counter(Metric):
+    """A value that only goes up."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1) -> None:
+        """Adds amount to the counter."""
+        self._value += amount
+
+
+class Gauge(Metric):
+    """A value that goes up and down."""
+
+    kind = "gauge"
+
+    def set(self, value: float) -> None:
+        """Replaces the value."""
+        self._value = value
+
+
+class Histogram(Metric):
+    """Counts observations into cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        buckets: Optional[Sequence[float]] = DEFAULT_BUCKETS,
+    ) -> None:
+        """Init method."""
+        super().__init__(name=name, description=description)
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    @property
+    def value(self) -> float:
+        """Mean of the observations."""
+        return self.sum / self.count if self.count else 0.0
+
+    def observe(self, value: float) -> None:
+        """Records an observation."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Observes how many seconds the block takes."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q quantile."""
+        if not self.count:
+            return 0.0
+        rank, total = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= rank:
+                return bound
+        return float("inf")
+
+    def samples(self) -> List[str]:
+        """Lines of the histogram in the Prometheus text format."""
+        lines, total = [], 0
+        for bound, count in zip((*self.buckets, "+Inf"), self.counts):
+            total += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {total}')
+        lines.append(f"{self.name}_sum {self.sum}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+class Registry:
+    """Holds the metrics exported by the bot."""
+
+    def __init__(self) -> None:
+        """Init method."""
+        self.metrics: Dict[str, Metric] = {}
+
+    def __iter__(self) -> Iterator[Metric]:
+        """Iterates over the metrics in registration order."""
+        return iter(self.metrics.values())
+
+    def register(self, metric: Metric) -> Metric:
+        """Adds a metric, refusing duplicated names."""
+        if metric.name in self.metrics:
+            raise ValueError(f"Duplicated metric: {metric.name}")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(
+        self, name: str, description: str, function: Optional[Callable] = None
+    ) -> Counter:
+        """Creates and registers a counter."""
+        return self.register(Counter(name, description, function=function))
+
+    def gauge(
+        self, name: str, description: str, function: Optional[Callable] = None
+    ) -> Gauge:
+        """Creates and registers a gauge."""
+        return self.register(Gauge(name, description, function=function))
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text format."""
+        return "\n".join(metric.render() for metric in self) + "\n"
+
+    def summary(self) -> Dict[str, Union[float, Dict[str, Any]]]:
+        """Current values, with count, mean and p95 for histograms."""
+        return {
+            metric.name: {
+                "count": metric.count,
+                "mean": metric.value,
+                "p95": metric.quantile(0.95),
+            }
+            if isinstance(metric, Histogram)
+            else metric.value
+            for metric in self
+        }
+
+
+class TimedRequestor(Requestor):
+    """A reddit requestor observing the latency of every HTTP request."""
+
+    def __init__(self, *args, histogram: Optional[Histogram] = None, **kwargs) -> None:
+        """Init method."""
+        super().__init__(*args, **kwargs)
+        self.histogram = histogram
+
+    async def request(self, *args, **kwargs) -> Any:
+        """Issues the request, timing it when a histogram is set."""
+        if self.histogram is None:
+            return await super().request(*args, **kwargs)
+        with self.histogram.time():
+            return await super().request(*args, **kwargs)
+
+
+class MetricsServer:
+    """Serves a registry in the Prometheus text format over HTTP."""
+
+    def __init__(
+        self,
+        registry: Registry,
+        host: Optional[str] = "127.0.0.1",
+        port: Optional[int] = 9108,
+    ) -> None:
+        """Init method."""
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.runner: Optional[web.AppRunner] = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """Returns the current metrics."""
+        return web.Response(
+            text=self.registry.render(), headers={"Content-Type": CONTENT_TYPE}
+        )
+
+    async def start(self) -> None:
+        """Starts listening on host and port."""
+        if self.runner is not None:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+
+    async def close(self) -> None:
+        """Stops listening."""
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
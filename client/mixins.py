@@ -1,46 +1,25 @@
 """Collection of mixins."""
-import json
-from typing import Any, Dict, List, Union, Generator, Optional, Callable
+import asyncio
+from typing import Dict, Iterator, List, Set, Tuple, Optional, Callable
 
 import asyncpraw
 import asyncprawcore
-from asyncpraw.models import ListingGenerator
+from asyncpraw.models import Submission
 
-from client.models import RedditHelper
-
-
-class Storage:
-    """Mixin for storing data."""
-
-    def __init__(self, filename: str = "data.json") -> None:
-        """Initialize the mixin."""
-        self.filename = filename
-
-    def get(
-        self,
-        default: Optional[Dict[str, Any]] = None,
-        callback: Optional[Callable] = None,
-    ) -> dict:
-        """Retrieves data from the given filename as a serialized json object.
-        Or creates a file with the default if it doesn't exist.
-        """
-
-        data = default or {}
-        try:
-            with open(self.filename, "r") as file:
-                data = json.load(file)
-        except (json.decoder.JSONDecodeError, FileNotFoundError):
-            self.set(data)
-        if callback:
-            callback()
-        return data
-
-    def set(self, data: Dict[str, Any], callback: Optional[Callable] = None) -> None:
-        """Saves the given data to the given filename in json format."""
-        with open(self.filename, "w") as file:
-            json.dump(data, file)
-        if callback:
-            callback()
+from client.backends import create_backend
+from client.caches import (
+    AuthorCache,
+    KindResolver,
+    SeenSet,
+    SingleFlight,
+    MISSING,
+    SUBREDDIT,
+)
+from client.index import RecentPosts, TitleIndex, expand
+from client.metrics import Histogram, TimedRequestor
+from client.ratelimit import INTERACTIVE, RequestBudget
+from client.render import DescriptionRenderer
+from client.models import RedditHelper, SubscriptionStore
 
 
 class Reddit:
@@ -52,55 +31,179 @@ class Reddit:
         client_secret: str,
         filename: str = "data.json",
         callback: Optional[Callable] = None,
+        write_delay: Optional[float] = 1.0,
+        storage_backend: Optional[str] = "json",
+        database: Optional[str] = "data.sqlite3",
+        author_cache_size: Optional[int] = 4096,
+        author_cache_ttl: Optional[float] = 3600,
+        author_cache_negative_ttl: Optional[float] = 600,
+        kinds_positive_ttl: Optional[float] = 86400,
+        kinds_negative_ttl: Optional[float] = 3600,
+        render_cache_size: Optional[int] = 2048,
+        render_executor_threshold: Optional[int] = None,
+        seen_ring_size: Optional[int] = 50,
+        request_rate: Optional[float] = 1,
+        request_burst: Optional[float] = 10,
+        oauth_url: Optional[str] = "https://oauth.reddit.com",
+        reddit_url: Optional[str] = "https://www.reddit.com",
+        index_size: Optional[int] = 10000,
+        index_max_age: Optional[float] = 604800,
+        recent_ring_size: Optional[int] = 10,
+        recent_max_age: Optional[float] = 120,
+        state_name: Optional[str] = None,
     ) -> None:
-        """Initialize the mixin."""
-        self.storage = Storage(filename=filename)
-        self.subreddits = self.storage.get(
-            default={"subscribed": [], "banned": []}, callback=callback
+        """Initialize the mixin.
+        Processes sharing a storage save their seen ids and kinds under their
+        own state_name, starting from the shared state the first time.
+        """
+        self.storage = create_backend(
+            name=storage_backend,
+            filename=filename,
+            database=database,
+            delay=write_delay,
+        )
+        self.subscriptions = SubscriptionStore(storage=self.storage, callback=callback)
+        self.request_latency = Histogram(
+            "reddit_request_seconds", "Latency of the HTTP requests made to Reddit."
         )
         self.request = asyncpraw.Reddit(
             client_id=client_id,
             client_secret=client_secret,
             user_agent=f"DISCORD_BOT:{client_id}:1.0",
+            oauth_url=oauth_url,
+            reddit_url=reddit_url,
+            requestor_class=TimedRequestor,
+            requestor_kwargs={"histogram": self.request_latency},
+        )
+        self.budget = RequestBudget(
+            reddit=self.request, rate=request_rate, burst=request_burst
+        )
+        self.authors = AuthorCache(
+            maxsize=author_cache_size,
+            ttl=author_cache_ttl,
+            negative_ttl=author_cache_negative_ttl,
+            budget=self.budget,
+        )
+        self.renderer = DescriptionRenderer(
+            cache_size=render_cache_size, executor_threshold=render_executor_threshold
+        )
+        self.kinds = KindResolver(
+            reddit=self.request,
+            positive_ttl=kinds_positive_ttl,
+            negative_ttl=kinds_negative_ttl,
+            budget=self.budget,
         )
+        self.state_keys = {
+            key: f"{key}-{state_name}" if state_name else key
+            for key in ("kinds", "seen")
+        }
+        self.kinds.load(self.load_state("kinds"))
+        self.seen = SeenSet(ring_size=seen_ring_size)
+        self.seen.load(self.load_state("seen"))
+        self.cursors: Dict[str, Tuple[str, float]] = self.storage.get_cursors()
+        self.fetches = SingleFlight()
+        self.index = TitleIndex(maxsize=index_size, max_age=index_max_age)
+        self.recent = RecentPosts(ring_size=recent_ring_size, max_age=recent_max_age)
+        self.changed_cursors: Set[str] = set()
 
     async def subreddit_exists(self, subreddit: str) -> bool:
         """Check if a subreddit exists."""
-        subreddit_exists = False
-        try:
-            _ = [
-                sub
-                async for sub in self.request.subreddits.search_by_name(
-                    query=subreddit, exact=True
-                )
-            ]
-            subreddit_exists = True
-        except (asyncprawcore.NotFound, asyncprawcore.exceptions.Redirect):
-            pass
-        return subreddit_exists
+        return await self.kinds.resolve(subreddit) == SUBREDDIT
+
+    def load_state(self, key: str) -> Dict:
+        """Reads the state of this process, or the shared one if it has none."""
+        state = self.storage.get_state(self.state_keys[key])
+        if state is None:
+            state = self.storage.get_state(key, default={})
+        return state
+
+    def save(self) -> None:
+        """Saves cached state that should survive restarts."""
+        if self.kinds.dirty:
+            self.storage.set_state(self.state_keys["kinds"], self.kinds.dump())
+        if self.seen.dirty:
+            self.storage.set_state(self.state_keys["seen"], self.seen.dump())
+        if self.changed_cursors:
+            self.storage.set_cursors(
+                {
+                    subreddit: self.cursors[subreddit]
+                    for subreddit in self.changed_cursors
+                }
+            )
+            self.changed_cursors = set()
+
+    def mark_delivered(
+        self, subreddit: str, submission_id: str, created: float
+    ) -> None:
+        """Moves the cursor of a subreddit forward to a delivered submission."""
+        if created > self.cursors.get(subreddit, ("", 0.0))[1]:
+            self.cursors[subreddit] = (submission_id, created)
+            self.changed_cursors.add(subreddit)
+
+    async def close(self) -> None:
+        """Writes pending changes and closes the reddit session."""
+        self.save()
+        await self.storage.close()
+        await self.request.close()
+        self.renderer.close()
 
     async def fetch(
         self,
         subreddit_or_redditor: str,
-        search_type: Optional[str] = "subreddit",
         search_term: Optional[str] = None,
-        fetch: Optional[bool] = True,
+        fetch: Optional[bool] = False,
         sort: Optional[str] = None,
         limit: Optional[int] = 1,
         *args,
         **kwargs,
-    ) -> Union[ListingGenerator, List]:
-        """Fetch posts from a subreddit or a redditor."""
-        if not await self.subreddit_exists(subreddit=subreddit_or_redditor):
-            search_type = "redditor"
-
+    ) -> List[Submission]:
+        """Fetch up to limit posts from a subreddit or a redditor.
+        Newest posts and searches are answered from what the streams have seen
+        when that is fresh and complete enough. Identical fetches running at the
+        same time share one request and result.
+        """
         if not search_term:
-            sort = "new"
+            sort = sort or "new"
+            if sort == "new" and (
+                records := self.recent.newest(
+                    subreddit=subreddit_or_redditor, limit=limit
+                )
+            ):
+                return [expand(self.request, record) for record in records]
+        elif matches := self.index.search(
+            subreddit=subreddit_or_redditor, query=search_term, limit=limit
+        ):
+            return [expand(self.request, record) for record in matches]
+        key = (subreddit_or_redditor.lower(), search_term, sort, limit)
+        return await self.fetches.do(
+            key,
+            lambda: self._fetch(
+                subreddit_or_redditor, search_term, fetch, sort, limit, *args, **kwargs
+            ),
+        )
+
+    async def _fetch(
+        self,
+        subreddit_or_redditor: str,
+        search_term: Optional[str],
+        fetch: bool,
+        sort: Optional[str],
+        limit: int,
+        *args,
+        **kwargs,
+    ) -> List[Submission]:
+        """Collects the posts of a fetch.
+        The resolved kind already proves the target exists, so it isn't fetched again.
+        """
+        search_type = await self.kinds.resolve(subreddit_or_redditor)
+        if search_type == MISSING:
+            return []
 
         results = []
+        await self.budget.acquire(INTERACTIVE)
         try:
             helper = RedditHelper(reddit=self.request, method=search_type)
-            results = await helper.filter(
+            listing = await helper.filter(
                 query=subreddit_or_redditor,
                 search_term=search_term,
                 fetch=fetch,
@@ -109,6 +212,10 @@ class Reddit:
                 *args,
                 **kwargs,
             )
+            async for submission in listing:
+                results.append(submission)
+                if len(results) >= limit:
+                    break
         except asyncprawcore.exceptions.Redirect:
             pass
         return results
@@ -121,15 +228,10 @@ class Reddit:
         callback: Optional[Callable] = None,
     ) -> None:
         """Store the channel id and subreddit to subscribe to. Subscribes by default."""
-        subscription = {"channel_id": channel_id, "subreddit": subreddit}
         if subscribe:
-            self.subreddits.setdefault("subscribed", []).append(subscription)
+            self.subscriptions.subscribe([(channel_id, subreddit)], callback=callback)
         else:
-            try:
-                self.subreddits.get("subscribed", []).remove(subscription)
-            except ValueError:
-                pass
-        self.storage.set(self.subreddits, callback=callback)
+            self.subscriptions.unsubscribe([(channel_id, subreddit)], callback=callback)
 
     def manage_moderation(
         self,
@@ -139,30 +241,35 @@ class Reddit:
     ) -> None:
         """Manages bans. Bans by default."""
         if ban:
-            [
-                self.manage_subscription(**sub, subscribe=False)
-                for sub in self.subreddits.get("subscribed", [])
-                if sub.get("subreddit") == subreddit
-            ]
-            self.subreddits.setdefault("banned", []).append(subreddit)
+            self.subscriptions.ban([subreddit], callback=callback)
         else:
-            try:
-                self.subreddits.get("banned", []).remove(subreddit)
-            except ValueError:
-                pass
-        self.storage.set(self.subreddits, callback=callback)
+            self.subscriptions.unban([subreddit], callback=callback)
+
+    async def refresh_subscriptions(self) -> bool:
+        """Reloads subscriptions and bans that other processes may have changed.
+        Returns True if they changed, and does nothing unless the storage is shared.
+        A reload racing a change made by this process is skipped.
+        """
+        if not self.storage.shared:
+            return False
+        changes = self.subscriptions.changes
+        data = await asyncio.get_running_loop().run_in_executor(None, self.storage.load)
+        if changes != self.subscriptions.changes:
+            return False
+        return self.subscriptions.reload(data)
 
     def subreddit_is_banned(self, subreddit: str) -> bool:
         """Checks if the given subreddit is banned."""
-        return subreddit in self.subreddits.get("banned", [])
+        return self.subscriptions.is_banned(subreddit)
 
-    def subreddit_is_subscribed(self, channel_id: str, subreddit: str) -> bool:
+    def subreddit_is_subscribed(self, channel_id: int, subreddit: str) -> bool:
         """Checks if the given subreddit is subscribed."""
-        return any(
-            channel_id == sub.get("channel_id") and subreddit == sub.get("subreddit")
-            for sub in self.subreddits.get("subscribed", [])
-        )
+        return self.subscriptions.is_subscribed(channel_id, subreddit)
+
+    def get_channels(self, subreddit: str) -> Set[int]:
+        """Returns the ids of the channels subscribed to the given subreddit."""
+        return self.subscriptions.channels(subreddit)
 
-    def get_subscriptions(self) -> Generator:
-        """Returns a generator with subscribed subreddits."""
-        return (sub.values() for sub in self.subreddits.get("subscribed", []))
+    def get_subscriptions(self) -> Iterator[Tuple[int, str]]:
+        """Returns an iterator with (channel_id, subreddit) subscriptions."""
+        return iter(self.subscriptions)
@@ -1,11 +1,11 @@
 """Collection of models."""
-from typing import Optional, Union
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Set, Tuple, Union
 
 from asyncpraw import Reddit
 from asyncpraw.models import ListingGenerator, Subreddit, Submission
 from asyncpraw.models.listing.mixins.redditor import SubListing
 
-from client.utils import refined_filter
+from client.utils import refined_filter, REDDITOR_SORTING_OPTIONS, SORTING_OPTIONS
 
 
 class RedditHelper:
@@ -19,7 +19,9 @@ class RedditHelper:
         if method.lower() not in ("subreddit", "redditor"):
             raise ValueError("Method must be either subreddit or redditor")
         self._method = method.lower()
-        self.sorting_options = ("new", "hot", "top", "rising", "controversial")
+        self.sorting_options = (
+            SORTING_OPTIONS if self._method == "subreddit" else REDDITOR_SORTING_OPTIONS
+        )
         super().__init__(*args, **kwargs)
 
     async def get(
@@ -53,7 +55,145 @@ class RedditHelper:
         response = await self.get(query=query, *args, **kwargs)
 
         if search_term:
-            response = refined_filter(search_term=search_term, submissions=response)
+            response = refined_filter(
+                search_term=search_term,
+                submissions=response,
+                find_closest_match=limit == 1,
+            )
         else:
             response = getattr(response, sort)(limit=limit)
         return response
+
+
+class SubscriptionStore:
+    """Subscriptions and bans with constant time lookups.
+
+    Subscriptions are indexed by (channel, subreddit), by subreddit and by
+    channel, and bans are kept in a set. Every mutation method takes a batch and
+    reports the changed rows to the storage backend once.
+    """
+
+    def __init__(self, storage: Any, callback: Optional[Callable] = None) -> None:
+        """Init method."""
+        self.storage = storage
+        self.records: Dict[Tuple[int, str], Dict[str, Any]] = {}
+        self.by_subreddit: Dict[str, Set[int]] = {}
+        self.by_channel: Dict[int, Set[str]] = {}
+        self.banned: Set[str] = set()
+        self.changes = 0
+        self.reload(
+            storage.load(default={"subscribed": [], "banned": []}, callback=callback)
+        )
+
+    def reload(self, data: Dict[str, Any]) -> bool:
+        """Replaces everything with a stored document, returning True if it changed."""
+        pairs = [
+            (sub["channel_id"], sub["subreddit"]) for sub in data.get("subscribed", [])
+        ]
+        banned = set(data.get("banned", []))
+        if set(pairs) == set(self.records) and banned == self.banned:
+            return False
+        self.records, self.by_subreddit, self.by_channel = {}, {}, {}
+        [self._add(channel_id, subreddit) for channel_id, subreddit in pairs]
+        self.banned = banned
+        return True
+
+    def __iter__(self) -> Iterator[Tuple[int, str]]:
+        """Iterates over (channel_id, subreddit) pairs."""
+        return iter(self.records)
+
+    def __len__(self) -> int:
+        """Number of subscriptions."""
+        return len(self.records)
+
+    def _add(self, channel_id: int, subreddit: str) -> bool:
+        """Indexes a subscription, returning False if it already exists."""
+        if (channel_id, subreddit) in self.records:
+            return False
+        self.records[(channel_id, subreddit)] = {
+            "channel_id": channel_id,
+            "subreddit": subreddit,
+        }
+        self.by_subreddit.setdefault(subreddit, set()).add(channel_id)
+        self.by_channel.setdefault(channel_id, set()).add(subreddit)
+        return True
+
+    def _remove(self, channel_id: int, subreddit: str) -> bool:
+        """Removes a subscription from the indexes, returning False if missing."""
+        if self.records.pop((channel_id, subreddit), None) is None:
+            return False
+        for index, key, value in (
+            (self.by_subreddit, subreddit, channel_id),
+            (self.by_channel, channel_id, subreddit),
+        ):
+            index[key].discard(value)
+            if not index[key]:
+                del index[key]
+        return True
+
+    def is_subscribed(self, channel_id: int, subreddit: str) -> bool:
+        """Checks if the channel is subscribed to the subreddit."""
+        return (channel_id, subreddit) in self.records
+
+    def is_banned(self, subreddit: str) -> bool:
+        """Checks if the subreddit is banned."""
+        return subreddit in self.banned
+
+    def channels(self, subreddit: str) -> Set[int]:
+        """Returns the channels subscribed to the subreddit."""
+        return self.by_subreddit.get(subreddit, set())
+
+    def subreddits(self, channel_id: Optional[int] = None) -> Set[str]:
+        """Returns the subscribed subreddits, optionally of a single channel."""
+        if channel_id is None:
+            return set(self.by_subreddit)
+        return self.by_channel.get(channel_id, set())
+
+    def subscribe(
+        self, pairs: Iterable[Tuple[int, str]], callback: Optional[Callable] = None
+    ) -> int:
+        """Adds (channel_id, subreddit) subscriptions, returning how many were new."""
+        subscribed = [pair for pair in pairs if self._add(*pair)]
+        self.save(subscribed=subscribed, callback=callback)
+        return len(subscribed)
+
+    def unsubscribe(
+        self, pairs: Iterable[Tuple[int, str]], callback: Optional[Callable] = None
+    ) -> int:
+        """Removes (channel_id, subreddit) subscriptions, returning how many existed."""
+        unsubscribed = [pair for pair in pairs if self._remove(*pair)]
+        self.save(unsubscribed=unsubscribed, callback=callback)
+        return len(unsubscribed)
+
+    def ban(
+        self, subreddits: Iterable[str], callback: Optional[Callable] = None
+    ) -> int:
+        """Bans subreddits and drops their subscriptions, returning how many were new."""
+        unsubscribed, banned = [], []
+        for subreddit in subreddits:
+            for channel_id in tuple(self.channels(subreddit)):
+                self._remove(channel_id=channel_id, subreddit=subreddit)
+                unsubscribed.append((channel_id, subreddit))
+            if subreddit not in self.banned:
+                self.banned.add(subreddit)
+                banned.append(subreddit)
+        self.save(unsubscribed=unsubscribed, banned=banned, callback=callback)
+        return len(banned)
+
+    def unban(
+        self, subreddits: Iterable[str], callback: Optional[Callable] = None
+    ) -> int:
+        """Lifts bans, returning how many subreddits were banned."""
+        unbanned = [subreddit for subreddit in subreddits if subreddit in self.banned]
+        self.banned.difference_update(unbanned)
+        self.save(unbanned=unbanned, callback=callback)
+        return len(unbanned)
+
+    def serialize(self) -> Dict[str, Any]:
+        """Returns the stored json representation."""
+        return {"subscribed": list(self.records.values()), "banned": list(self.banned)}
+
+    def save(self, callback: Optional[Callable] = None, **changes: Any) -> None:
+        """Reports changed subscriptions and bans to the storage backend."""
+        self.changes += 1
+        self.storage.save(document=self.serialize, callback=callback, **changes)
@@ -0,0 +1,63 @@
+"""Collection of partitioning helpers."""
+import hashlib
+from bisect import bisect
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+
+def stable_hash(key: str) -> int:
+    """A hash of key that is the same in every process."""
+    return int.from_bytes(
+        hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big"
+    )
+
+
+class HashRing:
+    """Consistent hashing of keys onto nodes.
+
+    Each node owns replicas points of the ring and a key belongs to the node of
+    the first point after its hash. Adding or removing a node only moves the
+    keys of the points it gains or loses.
+    """
+
+    def __init__(
+        self, nodes: Optional[Iterable[Hashable]] = (), replicas: Optional[int] = 100
+    ) -> None:
+        """Init method."""
+        self.replicas = replicas
+        self.points: List[Tuple[int, Hashable]] = []
+        self.nodes: Set[Hashable] = set()
+        [self.add(node) for node in nodes]
+
+    def __len__(self) -> int:
+        """Number of nodes."""
+        return len(self.nodes)
+
+    def add(self, node: Hashable) -> None:
+        """Adds a node to the ring."""
+        if node in self.nodes:
+            return
+        self.nodes.add(node)
+        self.points.extend(
+            (stable_hash(f"{node}#{replica}"), node) for replica in range(self.replicas)
+        )
+        self.points.sort()
+
+    def remove(self, node: Hashable) -> None:
+        """Removes a node from the ring."""
+        self.nodes.discard(node)
+        self.points = [point for point in self.points if point[1] != node]
+
+    def node_for(self, key: str) -> Optional[Hashable]:
+        """The node owning key, None when the ring is empty."""
+        if not self.points:
+            return None
+        index = bisect(self.points, (stable_hash(key),)) % len(self.points)
+        return self.points[index][1]
+
+    def assign(self, keys: Iterable[str]) -> Dict[Hashable, Set[str]]:
+        """Groups keys by the node owning them."""
+        assignments: Dict[Hashable, Set[str]] = {node: set() for node in self.nodes}
+        for key in keys:
+            if (node := self.node_for(key)) is not None:
+                assignments[node].add(key)
+        return assignments
@@ -0,0 +1,328 @@
+"""Collection of profiling helpers.
+
+Nothing here is installed until a profiler is started, so a bot that is not
+being profiled runs exactly the same code as before.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from asyncio import events
+from collections import Counter, defaultdict
+from types import FrameType
+from typing import Any, Dict, List, Optional, Tuple
+
+from discord.ext import commands
+
+OWN_MODULES = ("client", "plugins", "app")
+
+
+def describe_task(task: Optional[asyncio.Task]) -> str:
+    """Names a task after the innermost coroutine of this codebase it awaits."""
+    if task is None:
+        return "loop"
+    label, coroutine = task.get_name(), task.get_coro()
+    while coroutine is not None:
+        if (frame := getattr(coroutine, "cr_frame", None)) is not None:
+            if frame.f_globals.get("__name__", "").startswith(OWN_MODULES):
+                label = getattr(coroutine, "__qualname__", label)
+        coroutine = getattr(coroutine, "cr_await", None)
+    return label
+
+
+def frame_label(frame: FrameType) -> str:
+    """Module and function of a frame."""
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_name}"
+
+
+class SamplingProfiler:
+    """Samples the stack of the event loop thread from a background thread.
+
+    Every sample is rooted at the task running at that moment, so time spent
+    in each coroutine adds up in collapsed stacks readable by flamegraph tools.
+    """
+
+    def __init__(
+        self, loop: asyncio.AbstractEventLoop, interval: Optional[float] = 0.005
+    ) -> None:
+        """Init method."""
+        self.loop = loop
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.stopped = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.thread_id: Optional[int] = None
+
+    def start(self) -> None:
+        """Starts sampling the thread calling this method."""
+        self.thread_id = threading.get_ident()
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, name="profiler", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """Stops sampling."""
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self) -> None:
+        """Takes a sample every interval until stopped."""
+        while not self.stopped.wait(self.interval):
+            if (frame := sys._current_frames().get(self.thread_id)) is not None:
+                self.samples[self.collapse(frame)] += 1
+
+    def collapse(self, frame: FrameType) -> str:
+        """The stack of a frame, root first, joined by semicolons."""
+        stack = []
+        while frame is not None:
+            stack.append(frame_label(frame))
+            frame = frame.f_back
+        stack.append(describe_task(asyncio.current_task(self.loop)))
+        return ";".join(reversed(stack))
+
+    def folded(self) -> str:
+        """The samples in the collapsed stack format."""
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.samples.most_common()
+        )
+
+
+class LoopMonitor:
+    """Measures event loop lag and the callbacks that cause it.
+
+    While started, every callback the loop runs is timed and those slower
+    than slow_callback are attributed to their task. A heartbeat measures how
+    late the loop wakes it up.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        slow_callback: Optional[float] = 0.05,
+        heartbeat: Optional[float] = 0.1,
+    ) -> None:
+        """Init method."""
+        self.loop = loop
+        self.slow_callback = slow_callback
+        self.heartbeat = heartbeat
+        self.slow: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0, 0.0])
+        self.lags: List[float] = []
+        self.original = None
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Starts timing callbacks and the heartbeat."""
+        self.original = original = events.Handle._run
+        monitor = self
+
+        def _run(handle: events.Handle) -> None:
+            started = time.perf_counter()
+            try:
+                original(handle)
+            finally:
+                if (elapsed := time.perf_counter() - started) > monitor.slow_callback:
+                    monitor.record(handle, elapsed)
+
+        events.Handle._run = _run
+        self.task = self.loop.create_task(self.beat(), name="loop-monitor")
+
+    def stop(self) -> None:
+        """Restores the loop to its original state."""
+        if self.original is not None:
+            events.Handle._run = self.original
+            self.original = None
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def record(self, handle: events.Handle, elapsed: float) -> None:
+        """Attributes a slow callback to its task or function."""
+        callback = handle._callback
+        if isinstance(owner := getattr(callback, "__self__", None), asyncio.Task):
+            label = describe_task(owner)
+        else:
+            label = getattr(callback, "__qualname__", repr(callback))
+        entry = self.slow[label]
+        entry[0] += 1
+        entry[1] += elapsed
+        entry[2] = max(entry[2], elapsed)
+
+    async def beat(self) -> None:
+        """Records how late every heartbeat is."""
+        while True:
+            started = self.loop.time()
+            await asyncio.sleep(self.heartbeat)
+            self.lags.append(max(0.0, self.loop.time() - started - self.heartbeat))
+
+    def slowest(self, count: int = 10) -> List[Tuple[str, int, float, float]]:
+        """The callbacks with the most slow time: label, calls, total and max."""
+        return sorted(
+            ((label, *entry) for label, entry in self.slow.items()),
+            key=lambda entry: entry[2],
+            reverse=True,
+        )[:count]
+
+
+class CommandTimer:
+    """Times command invocations through the bot command events."""
+
+    def __init__(self, bot: commands.Bot) -> None:
+        """Init method."""
+        self.bot = bot
+        self.timings: Dict[str, List[float]] = defaultdict(list)
+
+    def start(self) -> None:
+        """Starts listening for commands."""
+        self.bot.add_listener(self.on_command)
+        self.bot.add_listener(self.on_command_completion)
+        self.bot.add_listener(self.on_command_error)
+
+    def stop(self) -> None:
+        """Stops listening for commands."""
+        self.bot.remove_listener(self.on_command)
+        self.bot.remove_listener(self.on_command_completion)
+        self.bot.remove_listener(self.on_command_error)
+
+    async def on_command(self, ctx: commands.Context) -> None:
+        """Notes when the command started."""
+        ctx.profile_started = time.perf_counter()
+
+    async def on_command_completion(self, ctx: commands.Context) -> None:
+        """Records how long the command took."""
+        if (started := getattr(ctx, "profile_started", None)) is not None:
+            name = f"{ctx.command.cog_name or 'Bot'}.{ctx.command.qualified_name}"
+            self.timings[name].append(time.perf_counter() - started)
+
+    async def on_command_error(self, ctx: commands.Context, error: Exception) -> None:
+        """Records failed commands too."""
+        await self.on_command_completion(ctx)
+
+
+class Profiler:
+    """Runs the profilers together and writes their results under directory.
+
+    Stopping writes a collapsed stack file for flamegraph tools and a text
+    report of loop lag, slow callbacks and command timings.
+    """
+
+    def __init__(
+        self,
+        bot: commands.Bot,
+        directory: str,
+        interval: Optional[float] = 0.005,
+        slow_callback: Optional[float] = 0.05,
+    ) -> None:
+        """Init method."""
+        self.bot = bot
+        self.directory = directory
+        self.interval = interval
+        self.slow_callback = slow_callback
+        self.sampler: Optional[SamplingProfiler] = None
+        self.monitor: Optional[LoopMonitor] = None
+        self.timer: Optional[CommandTimer] = None
+        self.started: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        """Checks if profiling is on."""
+        return self.started is not None
+
+    def start(self) -> None:
+        """Starts profiling, from the event loop thread."""
+        if self.running:
+            return
+        loop = asyncio.get_running_loop()
+        self.sampler = SamplingProfiler(loop=loop, interval=self.interval)
+        self.monitor = LoopMonitor(loop=loop, slow_callback=self.slow_callback)
+        self.timer = CommandTimer(bot=self.bot)
+        self.sampler.start()
+        self.monitor.start()
+        self.timer.start()
+        self.started = time.time()
+
+    def stop(self) -> Dict[str, Any]:
+        """Stops profiling and writes the results, returning the summary."""
+        if not self.running:
+            return {}
+        self.sampler.stop()
+        self.monitor.stop()
+        self.timer.stop()
+        summary = self.summary()
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started))
+        base = os.path.join(self.directory, f"profile-{stamp}")
+        with open(f"{base}.folded", "w", encoding="utf-8") as file:
+            file.write(self.sampler.folded())
+        with open(f"{base}.txt", "w", encoding="utf-8") as file:
+            file.write(self.report(summary))
+        summary["files"] = [f"{base}.folded", f"{base}.txt"]
+        self.started = None
+        return summary
+
+    def summary(self) -> Dict[str, Any]:
+        """What the profilers found so far."""
+        lags = sorted(self.monitor.lags)
+        return {
+            "duration": time.time() - self.started,
+            "samples": sum(self.sampler.samples.values()),
+            "max_lag": lags[-1] if lags else 0.0,
+            "p99_lag": lags[int(len(lags) * 0.99)] if lags else 0.0,
+            "slow_callbacks": self.monitor.slowest(),
+            "commands": {
+                name: (len(timings), sum(timings) / len(timings), max(timings))
+                for name, timings in self.timer.timings.items()
+            },
+        }
+
+    def report(self, summary: Dict[str, Any]) -> str:
+        """The summary as text."""
+        lines = [
+            f"Duration: {summary['duration']:.1f}s, samples: {summary['samples']}",
+            f"Loop lag: max {summary['max_lag'] * 1000:.1f}ms, "
+            f"p99 {summary['p99_lag'] * 1000:.1f}ms",
+            "",
+            "Slowest callbacks (calls, total, max):",
+            *(
+                f"  {label}: {calls}, {total * 1000:.1f}ms, {longest * 1000:.1f}ms"
+                for label, calls, total, longest in summary["slow_callbacks"]
+            ),
+            "",
+            "Commands (calls, mean, max):",
+            *(
+                f"  {name}: {calls}, {mean * 1000:.1f}ms, {longest * 1000:.1f}ms"
+                for name, (calls, mean, longest) in summary["commands"].items()
+            ),
+        ]
+        return "\n".join(lines) + "\n"
+
+
+class StartupTimer:
+    """Times the phases of startup, each from the end of the previous one."""
+
+    def __init__(self, started: Optional[float] = None) -> None:
+        """Init method."""
+        self.started = time.perf_counter() if started is None else started
+        self.last = self.started
+        self.phases: List[Tuple[str, float]] = []
+        self.done = False
+
+    @property
+    def total(self) -> float:
+        """Seconds from the start to the last phase."""
+        return self.last - self.started
+
+    def mark(self, phase: str) -> None:
+        """Ends a phase."""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def report(self) -> str:
+        """The phases and their durations as text."""
+        lines = [f"Startup took {self.total * 1000:.0f}ms:"]
+        lines.extend(
+            f"  {phase}: {elapsed * 1000:.1f}ms" for phase, elapsed in self.phases
+        )
+        return "\n".join(lines)
@@ -0,0 +1,145 @@
+"""Collection of rate limiting helpers."""
+import asyncio
+import time
+from typing import Any, Callable, Dict, Optional
+
+import asyncpraw
+
+INTERACTIVE = "interactive"
+STREAM = "stream"
+BACKGROUND = "background"
+LANES = (INTERACTIVE, STREAM, BACKGROUND)
+
+
+class TokenBucket:
+    """Allows bursts of capacity calls, refilled at rate calls per second."""
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: Optional[float] = None,
+        clock: Optional[Callable[[], float]] = time.monotonic,
+    ) -> None:
+        """Init method."""
+        if rate <= 0:
+            raise ValueError("Rate must be positive")
+        self.rate = rate
+        self.capacity = rate if capacity is None else capacity
+        self.clock = clock
+        self.tokens = self.capacity
+        self.updated = clock()
+
+    def refill(self) -> None:
+        """Adds the tokens earned since the last refill."""
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, tokens: float = 1) -> float:
+        """Seconds until the given tokens are available."""
+        self.refill()
+        return max(0.0, (tokens - self.tokens) / self.rate)
+
+    def consume(self, tokens: float = 1) -> bool:
+        """Takes tokens if they are available."""
+        self.refill()
+        if self.tokens < tokens:
+            return False
+        self.tokens -= tokens
+        return True
+
+    async def acquire(self, tokens: float = 1) -> None:
+        """Waits until tokens are available and takes them."""
+        while not self.consume(tokens):
+            await asyncio.sleep(self.delay(tokens))
+
+
+class RequestBudget:
+    """Shares the Reddit request quota between priority lanes.
+
+    A local bucket paces requests, and the X-Ratelimit headers tracked by the
+    reddit session decide how much of the window is left. Each lane stops once
+    the remaining quota falls to its reserve, a fraction of the window kept for
+    the lanes above it. While a lane has waiters, the lanes below it wait too.
+    """
+
+    def __init__(
+        self,
+        reddit: Optional[asyncpraw.Reddit] = None,
+        rate: Optional[float] = 1,
+        burst: Optional[float] = 10,
+        reserves: Optional[Dict[str, float]] = None,
+        tick: Optional[float] = 0.05,
+    ) -> None:
+        """Init method."""
+        self.reddit = reddit
+        self.bucket = TokenBucket(rate=rate, capacity=burst)
+        self.reserves = {INTERACTIVE: 0.0, STREAM: 0.1, BACKGROUND: 0.3}
+        self.reserves.update(reserves or {})
+        self.tick = tick
+        self.waiting = dict.fromkeys(LANES, 0)
+        self.granted = dict.fromkeys(LANES, 0)
+        self.remaining: Optional[float] = None
+        self.used: Optional[int] = None
+        self.reset: Optional[float] = None
+
+    def update(self) -> None:
+        """Reads the quota reported by Reddit on the latest response."""
+        core = getattr(self.reddit, "_core", None)
+        if (limiter := getattr(core, "_rate_limiter", None)) is None:
+            return
+        self.remaining = limiter.remaining
+        self.used = limiter.used
+        self.reset = limiter.reset_timestamp
+
+    def headroom(self, lane: str) -> bool:
+        """Checks if the remaining quota is above the reserve of the lane."""
+        if self.remaining is None or self.used is None:
+            return True
+        if self.reset is not None and self.reset <= time.time():
+            return True
+        return self.remaining > self.reserves[lane] * (self.remaining + self.used)
+
+    def blocked(self, lane: str) -> bool:
+        """Checks if a lane of higher priority is waiting."""
+        return any(self.waiting[other] for other in LANES[: LANES.index(lane)])
+
+    def delay(self, lane: str) -> float:
+        """Seconds to wait before the lane checks again."""
+        if not self.headroom(lane):
+            return max(self.reset - time.time(), self.tick)
+        return max(self.bucket.delay(), self.tick)
+
+    async def acquire(self, lane: str = BACKGROUND) -> None:
+        """Waits until a request of the given lane may be made."""
+        if lane not in LANES:
+            raise ValueError(f"Invalid lane: {lane}")
+        self.waiting[lane] += 1
+        try:
+            self.update()
+            while (
+                self.blocked(lane)
+                or not self.headroom(lane)
+                or not self.bucket.consume()
+            ):
+                await asyncio.sleep(self.delay(lane))
+                self.update()
+        finally:
+            self.waiting[lane] -= 1
+        self.granted[lane] += 1
+
+    @property
+    def state(self) -> Dict[str, Any]:
+        """The current budget, as reported by Reddit and the local bucket."""
+        self.update()
+        self.bucket.refill()
+        return {
+            "remaining": self.remaining,
+            "used": self.used,
+            "reset_in": None
+            if self.reset is None
+            else max(0.0, round(self.reset - time.time(), 1)),
+            "tokens": round(self.bucket.tokens, 2),
+            "waiting": dict(self.waiting),
+            "granted": dict(self.granted),
+        }
@@ -0,0 +1,87 @@
+"""Collection of rendering helpers."""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Optional
+
+from client.caches import TTLCache
+
+if TYPE_CHECKING:
+    from client.converter import Converter
+
+
+class DescriptionRenderer:
+    """Renders submission descriptions with a bounded cost per post.
+
+    Converters are reused, one per thread, and only convert enough html to
+    fill the description. Results are cached by submission id and edit time.
+    Conversions of html longer than executor_threshold run in a thread pool.
+    """
+
+    def __init__(
+        self,
+        cache_size: Optional[int] = 2048,
+        executor_threshold: Optional[int] = None,
+        max_workers: Optional[int] = 2,
+    ) -> None:
+        """Init method."""
+        self.cache = TTLCache(maxsize=cache_size, ttl=float("inf"))
+        self.executor_threshold = executor_threshold
+        self.executor = (
+            ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="render")
+            if executor_threshold
+            else None
+        )
+        self.local = threading.local()
+        self.renders = 0
+        self.render_time = 0.0
+        self.max_render_time = 0.0
+
+    @property
+    def average_render_time(self) -> float:
+        """Mean seconds spent converting a description."""
+        return self.render_time / self.renders if self.renders else 0.0
+
+    def converter(self) -> "Converter":
+        """Returns the converter of the current thread."""
+        if (converter := getattr(self.local, "converter", None)) is None:
+            from client.converter import Converter
+
+            converter = self.local.converter = Converter()
+        return converter
+
+    def convert(self, html: str, max_length: int) -> str:
+        """Converts html and truncates it to max_length characters."""
+        started = time.perf_counter()
+        description = self.converter().convert(html, limit=max_length * 2 + 100)
+        if len(description) > max_length:
+            description = f"{description[:max_length]}..."
+        elapsed = time.perf_counter() - started
+        self.renders += 1
+        self.render_time += elapsed
+        self.max_render_time = max(self.max_render_time, elapsed)
+        return description
+
+    async def render(
+        self, html: str, key: Optional[tuple] = None, max_length: Optional[int] = 150
+    ) -> str:
+        """Returns the truncated text of html, using the cache when keyed."""
+        if key is not None:
+            key = (*key, max_length)
+        if key is not None and (description := self.cache.get(key)) is not None:
+            return description
+        if self.executor and len(html) > self.executor_threshold:
+            description = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.convert, html, max_length
+            )
+        else:
+            description = self.convert(html, max_length)
+        if key is not None:
+            self.cache.set(key, description)
+        return description
+
+    def close(self) -> None:
+        """Shuts the thread pool down."""
+        if self.executor:
+            self.executor.shutdown(wait=False)
@@ -0,0 +1,630 @@
+"""Collection of subscription stream engines."""
+import asyncio
+import itertools
+import logging
+import time
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+import asyncpraw
+from asyncpraw.models import Submission
+from asyncpraw.models.util import ExponentialCounter
+
+from client.caches import SeenSet
+from client.health import Backoff, CircuitBreaker, CLOSED, DEGRADED, DOWN, HEALTHY, OPEN
+from client.index import RecentPosts, compact
+from client.ratelimit import STREAM, RequestBudget
+from client.utils import format_exception, EXCEPTIONS
+
+PAGE_SIZE = 100
+
+
+class StreamShard:
+    """A bounded, mutable group of subreddits polled as a single multireddit.
+
+    Membership can change while the shard is running: the next poll simply
+    requests the new multireddit. Delivered ids go to a seen set shared by every
+    shard. Subreddits the seen set knows nothing about are primed on their first
+    poll so their existing posts are not delivered. Failed polls are retried
+    with jittered exponential backoff, and a circuit breaker pauses the shard
+    after failure_threshold failures in a row.
+    """
+
+    def __init__(
+        self,
+        reddit: asyncpraw.Reddit,
+        callback: Callable[[Submission], Awaitable[None]],
+        seen: Optional[SeenSet] = None,
+        name: str = "shard",
+        limit: Optional[int] = 100,
+        retry_delay: Optional[float] = 5,
+        max_delay: Optional[int] = 16,
+        logger: Optional[logging.Logger] = None,
+        budget: Optional[RequestBudget] = None,
+        max_backoff: Optional[float] = 300,
+        failure_threshold: Optional[int] = 5,
+        reset_timeout: Optional[float] = 60,
+        recent: Optional[RecentPosts] = None,
+    ) -> None:
+        """Init method."""
+        self.reddit = reddit
+        self.callback = callback
+        self.budget = budget
+        self.recent = recent
+        self.name = name
+        self.limit = limit
+        self.retry_delay = retry_delay
+        self.max_delay = max_delay
+        self.backoff = Backoff(base=retry_delay, maximum=max_backoff)
+        self.breaker = CircuitBreaker(
+            failure_threshold=failure_threshold, reset_timeout=reset_timeout
+        )
+        self.last_error: Optional[str] = None
+        self.last_success: Optional[float] = None
+        self.logger = logger or logging.getLogger(__name__)
+        self.subreddits: Set[str] = set()
+        self.priming: Set[str] = set()
+        self.seen = SeenSet() if seen is None else seen
+        self.counter = ExponentialCounter(max_counter=max_delay)
+        self.task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        """Number of subreddits in the shard."""
+        return len(self.subreddits)
+
+    def add(self, subreddit: str, resume: bool = False) -> None:
+        """Add a subreddit, skipping the posts it already has.
+        When resuming, posts newer than the ones in the seen set are delivered.
+        """
+        if subreddit not in self.subreddits:
+            self.subreddits.add(subreddit)
+            if not (resume and self.seen.knows(subreddit)):
+                self.priming.add(subreddit)
+
+    def remove(self, subreddit: str) -> None:
+        """Remove a subreddit from the shard."""
+        self.subreddits.discard(subreddit)
+        self.priming.discard(subreddit)
+
+    def start(self) -> None:
+        """Start polling in the background."""
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run(), name=self.name)
+
+    def cancel(self) -> None:
+        """Stop polling."""
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def poll(self) -> List[Submission]:
+        """Fetch the unseen submissions of the shard, oldest first."""
+        priming = set(self.priming)
+        if self.budget:
+            await self.budget.acquire(STREAM)
+        multireddit = await self.reddit.subreddit("+".join(sorted(self.subreddits)))
+        listing = [submission async for submission in multireddit.new(limit=self.limit)]
+        submissions = []
+        for submission in reversed(listing):
+            subreddit = submission.subreddit.display_name.lower()
+            if subreddit not in self.subreddits:
+                continue
+            if not self.seen.add(subreddit, submission.id):
+                continue
+            self.observe(subreddit, submission)
+            if self.recent is not None:
+                self.recent.add(compact(submission))
+            if subreddit not in priming:
+                submissions.append(submission)
+        self.priming -= priming
+        if self.recent is not None:
+            self.recent.touch(self.subreddits)
+        return submissions
+
+    def observe(self, subreddit: str, submission: Submission) -> None:
+        """Called with every submission the shard sees for the first time."""
+
+    def delay(self, submissions: List[Submission]) -> float:
+        """Seconds to wait before the next poll, backing off while idle."""
+        if submissions:
+            self.counter.reset()
+            return 0
+        return self.counter.counter()
+
+    @property
+    def health(self) -> Dict[str, Any]:
+        """The breaker state and latest outcome of the shard."""
+        return {
+            "state": self.breaker.state,
+            "failures": self.breaker.failures,
+            "subreddits": len(self.subreddits),
+            "last_error": self.last_error,
+            "last_success": self.last_success,
+        }
+
+    def failed(self, error: Exception) -> None:
+        """Records a failed poll, logging only when it changes the shard state."""
+        self.last_error = repr(error)
+        failures = self.breaker.failures
+        if self.breaker.record_failure():
+            self.logger.warning(
+                f"{self.name} paused after {self.breaker.failures} failed polls: "
+                f"{error!r}"
+            )
+        elif not failures:
+            if isinstance(error, EXCEPTIONS):
+                self.logger.warning(
+                    f"{self.name} poll failed: {error!r}", extra={"shard": self.name}
+                )
+            else:
+                self.logger.error(
+                    format_exception(error=error), extra={"shard": self.name}
+                )
+
+    def succeeded(self) -> None:
+        """Records a successful poll."""
+        self.last_success = time.time()
+        self.backoff.reset()
+        if self.breaker.record_success():
+            self.logger.info(f"{self.name} recovered")
+
+    async def run(self) -> None:
+        """Poll forever, waiting between polls as decided by delay."""
+        while self.subreddits:
+            if not self.breaker.allow():
+                await asyncio.sleep(self.breaker.remaining())
+                continue
+            try:
+                submissions = await self.poll()
+            except Exception as error:
+                self.failed(error)
+                await asyncio.sleep(self.backoff.next())
+                continue
+            self.succeeded()
+            for submission in submissions:
+                await self.deliver(submission)
+            await asyncio.sleep(self.delay(submissions))
+
+    async def deliver(self, submission: Submission) -> None:
+        """Hand a submission to the callback without letting it break the stream."""
+        try:
+            await self.callback(submission)
+        except Exception as error:
+            self.logger.error(
+                format_exception(error=error),
+                extra={
+                    "shard": self.name,
+                    "subreddit": submission.subreddit.display_name.lower(),
+                    "submission_id": submission.id,
+                },
+            )
+
+
+class StreamManager:
+    """Keeps a set of running shards in sync with the subscriptions.
+
+    Subscription changes are applied as deltas: only the shard owning an added
+    or removed subreddit is touched and no stream is ever restarted. Methods
+    that start shards must be called from the running event loop.
+    """
+
+    shard_class = StreamShard
+
+    def __init__(
+        self,
+        reddit: asyncpraw.Reddit,
+        callback: Callable[[Submission], Awaitable[None]],
+        shard_size: Optional[int] = 100,
+        seen: Optional[SeenSet] = None,
+        logger: Optional[logging.Logger] = None,
+        budget: Optional[RequestBudget] = None,
+        max_backoff: Optional[float] = 300,
+        failure_threshold: Optional[int] = 5,
+        reset_timeout: Optional[float] = 60,
+        recent: Optional[RecentPosts] = None,
+    ) -> None:
+        """Init method."""
+        if shard_size < 1:
+            raise ValueError("Shard size must be a positive integer")
+        self.reddit = reddit
+        self.callback = callback
+        self.budget = budget
+        self.max_backoff = max_backoff
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.recent = recent
+        self.seen = SeenSet() if seen is None else seen
+        self.shard_size = shard_size
+        self.logger = logger or logging.getLogger(__name__)
+        self.shards: List[StreamShard] = []
+        self.assignments: Dict[str, StreamShard] = {}
+        self._ids = itertools.count()
+
+    @property
+    def subreddits(self) -> Set[str]:
+        """Subreddits currently being streamed."""
+        return set(self.assignments)
+
+    @property
+    def health(self) -> Dict[str, Any]:
+        """Overall stream status along with the health of every shard."""
+        states = [shard.breaker.state for shard in self.shards]
+        if all(state == CLOSED for state in states):
+            status = HEALTHY
+        elif all(state == OPEN for state in states):
+            status = DOWN
+        else:
+            status = DEGRADED
+        return {
+            "status": status,
+            "shards": {shard.name: shard.health for shard in self.shards},
+        }
+
+    def shard_options(self) -> Dict[str, Any]:
+        """Keyword arguments shared by every new shard."""
+        return {
+            "reddit": self.reddit,
+            "callback": self.callback,
+            "seen": self.seen,
+            "logger": self.logger,
+            "budget": self.budget,
+            "max_backoff": self.max_backoff,
+            "failure_threshold": self.failure_threshold,
+            "reset_timeout": self.reset_timeout,
+            "recent": self.recent,
+        }
+
+    def new_shard(self) -> StreamShard:
+        """Create and register an empty shard."""
+        shard = self.shard_class(
+            name=f"shard-{next(self._ids)}", **self.shard_options()
+        )
+        self.shards.append(shard)
+        return shard
+
+    def add(self, subreddit: str, resume: bool = False) -> None:
+        """Stream a subreddit in the first shard with room for it."""
+        if subreddit in self.assignments:
+            return
+        shard = next(
+            (shard for shard in self.shards if len(shard) < self.shard_size), None
+        )
+        if shard is None:
+            shard = self.new_shard()
+        shard.add(subreddit, resume=resume)
+        self.assignments[subreddit] = shard
+        shard.start()
+
+    def remove(self, subreddit: str) -> None:
+        """Stop streaming a subreddit, dropping its shard once empty."""
+        if (shard := self.assignments.pop(subreddit, None)) is None:
+            return
+        shard.remove(subreddit)
+        if not shard.subreddits:
+            shard.cancel()
+            self.shards.remove(shard)
+
+    def sync(self, subreddits: Iterable[str], resume: bool = False) -> None:
+        """Apply the difference between the running and wanted subreddits.
+        Resume after a restart to deliver what was missed since the last save.
+        """
+        wanted = set(subreddits)
+        for subreddit in self.subreddits - wanted:
+            self.remove(subreddit)
+            if self.recent is not None:
+                self.recent.forget(subreddit)
+        for subreddit in sorted(wanted - self.subreddits):
+            self.add(subreddit, resume=resume)
+
+    def close(self) -> None:
+        """Stop every shard."""
+        for shard in self.shards:
+            shard.cancel()
+        self.shards = []
+        self.assignments = {}
+
+
+class PostRates:
+    """Estimates how often each subreddit gets a new post.
+
+    Keeps an exponentially weighted moving average of the time between posts.
+    Silence longer than the average stretches the estimate, so subreddits that
+    go quiet are polled less over time.
+    """
+
+    def __init__(
+        self, alpha: Optional[float] = 0.2, default_interval: Optional[float] = 3600
+    ) -> None:
+        """Init method."""
+        self.alpha = alpha
+        self.default_interval = default_interval
+        self.intervals: Dict[str, float] = {}
+        self.latest: Dict[str, float] = {}
+
+    def observe(self, subreddit: str, created: float) -> None:
+        """Records a post made at the given time."""
+        if (latest := self.latest.get(subreddit)) is None:
+            self.latest[subreddit] = created
+            return
+        if created <= latest:
+            return
+        gap = created - latest
+        interval = self.intervals.get(subreddit, gap)
+        self.intervals[subreddit] = self.alpha * gap + (1 - self.alpha) * interval
+        self.latest[subreddit] = created
+
+    def interval(self, subreddit: str, now: Optional[float] = None) -> float:
+        """Expected seconds between posts of the subreddit."""
+        if (interval := self.intervals.get(subreddit)) is None:
+            return self.default_interval
+        now = time.time() if now is None else now
+        return max(interval, now - self.latest[subreddit])
+
+    def rate(self, subreddits: Iterable[str]) -> float:
+        """Expected posts per second across the subreddits."""
+        now = time.time()
+        return sum(1 / self.interval(subreddit, now) for subreddit in subreddits)
+
+    def forget(self, subreddit: str) -> None:
+        """Drops the estimate of a subreddit."""
+        self.intervals.pop(subreddit, None)
+        self.latest.pop(subreddit, None)
+
+
+class AdaptiveShard(StreamShard):
+    """A shard that polls as often as its subreddits post.
+
+    The delay between polls aims for target_posts new posts per poll, never
+    longer than max_latency, never shorter than min_interval and always short
+    enough for the listing window to hold every new post.
+    """
+
+    def __init__(
+        self,
+        *args,
+        rates: Optional[PostRates] = None,
+        dedicated: bool = False,
+        target_posts: Optional[float] = 1,
+        min_interval: Optional[float] = 2,
+        max_latency: Optional[float] = 60,
+        **kwargs,
+    ) -> None:
+        """Init method."""
+        super().__init__(*args, **kwargs)
+        self.rates = PostRates() if rates is None else rates
+        self.dedicated = dedicated
+        self.target_posts = target_posts
+        self.min_interval = min_interval
+        self.max_latency = max_latency
+
+    def observe(self, subreddit: str, submission: Submission) -> None:
+        """Feeds the post rate estimate."""
+        self.rates.observe(subreddit, submission.created_utc)
+
+    def delay(self, submissions: List[Submission]) -> float:
+        """Seconds until the expected number of new posts is reached."""
+        if not (rate := self.rates.rate(self.subreddits)):
+            return self.max_latency
+        delay = min(self.target_posts, self.limit / 2) / rate
+        return min(max(delay, self.min_interval), self.max_latency)
+
+
+class AdaptiveStreamManager(StreamManager):
+    """Schedules polls from the observed post rate of each subreddit.
+
+    Subreddits posting more often than every hot_interval seconds get a
+    dedicated shard polled quickly, while quiet ones share multireddit shards
+    that are polled just often enough to keep delivery within max_latency.
+    Subreddits move between the two as their rate changes on every sync.
+    """
+
+    shard_class = AdaptiveShard
+
+    def __init__(
+        self,
+        *args,
+        hot_interval: Optional[float] = 30,
+        min_interval: Optional[float] = 2,
+        max_latency: Optional[float] = 60,
+        rates: Optional[PostRates] = None,
+        **kwargs,
+    ) -> None:
+        """Init method."""
+        super().__init__(*args, **kwargs)
+        self.hot_interval = hot_interval
+        self.min_interval = min_interval
+        self.max_latency = max_latency
+        self.rates = PostRates() if rates is None else rates
+
+    def is_hot(self, subreddit: str) -> bool:
+        """Checks if the subreddit posts often enough for a dedicated shard."""
+        return self.rates.interval(subreddit) < self.hot_interval
+
+    def shard_options(self) -> Dict[str, Any]:
+        """Keyword arguments shared by every new shard."""
+        return {
+            **super().shard_options(),
+            "rates": self.rates,
+            "min_interval": self.min_interval,
+            "max_latency": self.max_latency,
+        }
+
+    def new_shard(self, dedicated: bool = False) -> AdaptiveShard:
+        """Create and register an empty shard."""
+        shard = self.shard_class(
+            name=f"{'hot' if dedicated else 'shard'}-{next(self._ids)}",
+            dedicated=dedicated,
+            **self.shard_options(),
+        )
+        self.shards.append(shard)
+        return shard
+
+    def add(self, subreddit: str, resume: bool = False) -> None:
+        """Stream a subreddit in a dedicated shard if hot, else a shared one."""
+        if subreddit in self.assignments:
+            return
+        if self.is_hot(subreddit):
+            shard = self.new_shard(dedicated=True)
+        else:
+            shard = next(
+                (
+                    shard
+                    for shard in self.shards
+                    if not shard.dedicated and len(shard) < self.shard_size
+                ),
+                None,
+            )
+            if shard is None:
+                shard = self.new_shard()
+        shard.add(subreddit, resume=resume)
+        self.assignments[subreddit] = shard
+        shard.start()
+
+    def remove(self, subreddit: str) -> None:
+        """Stop streaming a subreddit and forget its rate."""
+        super().remove(subreddit)
+        self.rates.forget(subreddit)
+
+    def rebalance(self) -> None:
+        """Moves subreddits whose rate crossed hot_interval to the right shard."""
+        for subreddit, shard in tuple(self.assignments.items()):
+            if self.is_hot(subreddit) != shard.dedicated:
+                super().remove(subreddit)
+                self.add(subreddit, resume=True)
+
+    def sync(self, subreddits: Iterable[str], resume: bool = False) -> None:
+        """Apply the subscription changes, then rebalance."""
+        super().sync(subreddits, resume=resume)
+        self.rebalance()
+
+
+class CatchUp:
+    """Delivers what was posted to subscribed subreddits while the bot was down.
+
+    Subreddits are grouped into multireddits of group_size, whose new listings
+    are paged concurrently back to the oldest cursor of the group, taking a
+    request token for every page of at most max_pages. Per subreddit
+    the max_posts newest posts younger than max_age seconds and newer than its
+    cursor are delivered oldest first. The other posts newer than the cursor are
+    marked as seen, so the resumed streams do not deliver them either.
+    """
+
+    def __init__(
+        self,
+        reddit: asyncpraw.Reddit,
+        callback: Callable[[Submission], Awaitable[None]],
+        seen: SeenSet,
+        max_age: Optional[float] = 21600,
+        max_posts: Optional[int] = 25,
+        group_size: Optional[int] = 100,
+        concurrency: Optional[int] = 8,
+        logger: Optional[logging.Logger] = None,
+        budget: Optional[RequestBudget] = None,
+        max_pages: Optional[int] = 10,
+    ) -> None:
+        """Init method."""
+        self.reddit = reddit
+        self.callback = callback
+        self.budget = budget
+        self.max_pages = max_pages
+        self.seen = seen
+        self.max_age = max_age
+        self.max_posts = max_posts
+        self.group_size = group_size
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.logger = logger or logging.getLogger(__name__)
+
+    async def listing(self, subreddits: Iterable[str]) -> AsyncIterator[Submission]:
+        """The new listing of a multireddit, requested one page at a time."""
+        multireddit = await self.reddit.subreddit("+".join(sorted(subreddits)))
+        after = None
+        for _ in range(self.max_pages):
+            if self.budget:
+                await self.budget.acquire(STREAM)
+            page = [
+                submission
+                async for submission in multireddit.new(
+                    limit=PAGE_SIZE, params={"after": after} if after else None
+                )
+            ]
+            for submission in page:
+                yield submission
+            if len(page) < PAGE_SIZE:
+                return
+            after = page[-1].fullname
+
+    async def fetch(
+        self, cursors: Dict[str, Tuple[str, float]], cutoff: float
+    ) -> List[Submission]:
+        """Pages the new listing of a group of subreddits back to their cursors.
+        Stops early once every subreddit has filled its seen ring.
+        """
+        oldest = min(created for _, created in cursors.values())
+        wanted = max(self.max_posts, self.seen.ring_size)
+        counts = dict.fromkeys(cursors, 0)
+        submissions = []
+        async with self.semaphore:
+            async for submission in self.listing(cursors):
+                if submission.created_utc <= oldest:
+                    break
+                subreddit = submission.subreddit.display_name.lower()
+                if subreddit not in cursors or counts[subreddit] >= wanted:
+                    continue
+                cursor_id, cursor_time = cursors[subreddit]
+                if submission.id == cursor_id or submission.created_utc <= cursor_time:
+                    continue
+                counts[subreddit] += 1
+                if (
+                    counts[subreddit] <= self.max_posts
+                    and submission.created_utc > cutoff
+                ):
+                    submissions.append(submission)
+                else:
+                    self.seen.add(subreddit, submission.id)
+                if all(count >= wanted for count in counts.values()):
+                    break
+        return submissions
+
+    async def run(self, cursors: Dict[str, Tuple[str, float]]) -> int:
+        """Delivers the missed submissions, returning how many were delivered."""
+        if not self.max_posts or not cursors:
+            return 0
+        cutoff = time.time() - self.max_age
+        names = sorted(cursors)
+        groups = [
+            {name: cursors[name] for name in names[index : index + self.group_size]}
+            for index in range(0, len(names), self.group_size)
+        ]
+        results = await asyncio.gather(
+            *(self.fetch(group, cutoff=cutoff) for group in groups),
+            return_exceptions=True,
+        )
+        submissions = []
+        for result in results:
+            if isinstance(result, BaseException):
+                self.logger.warning(f"Catch up failed: {result!r}")
+            else:
+                submissions.extend(result)
+        delivered = 0
+        for submission in sorted(submissions, key=lambda s: s.created_utc):
+            subreddit = submission.subreddit.display_name.lower()
+            if self.seen.add(subreddit, submission.id):
+                try:
+                    await self.callback(submission)
+                    delivered += 1
+                except Exception as error:
+                    self.logger.error(
+                        format_exception(error=error),
+                        extra={"subreddit": subreddit, "submission_id": submission.id},
+                    )
+        return delivered
@@ -1,20 +1,26 @@
 """Collection of utility functions."""
 import asyncio
 import socket
+import sys
 import traceback
 from datetime import datetime
 from functools import wraps
 from typing import Any, Union, Dict, Optional, Iterable, Generator, Mapping, Callable
 
 import asyncprawcore
-import html2text
-import tabulate
 from aiohttp import ClientOSError, ClientConnectorError
 from asyncpraw.models import Submission, Subreddit
 from asyncpraw.models.listing.mixins.redditor import SubListing
 from asyncprawcore import RequestException
 from discord import Embed
 
+from client.caches import AuthorCache
+from client.ratelimit import BACKGROUND
+from client.render import DescriptionRenderer
+
+SORTING_OPTIONS = ("new", "hot", "top", "rising", "controversial")
+REDDITOR_SORTING_OPTIONS = ("new", "hot", "top", "controversial")
+
 EXCEPTIONS = (
     RequestException,
     ClientOSError,
@@ -97,8 +103,13 @@ async def create_discord_embed(
     color: Union[int, str] = 0xFF4500,
     max_title_length: Optional[int] = 256,
     max_description_length: Optional[int] = 150,
+    authors: Optional[AuthorCache] = None,
+    renderer: Optional[DescriptionRenderer] = None,
+    lane: Optional[str] = BACKGROUND,
 ) -> Embed:
-    """Create a discord embed from a Reddit submission."""
+    """Create a discord embed from a Reddit submission.
+    The author is looked up with a request token from the given lane.
+    """
     embed_dict = {
         "color": color,
         **get_attributes(
@@ -122,26 +133,26 @@ async def create_discord_embed(
             embed_dict["title"] = title[:max_title_length]
 
     if description := embed_dict.get("description"):
-        html = html2text.HTML2Text()
-        html.ignore_links = True
-        description = html.handle(description)
-        if len(description) > max_description_length:
-            description = f"{description[:max_description_length]}..."
-        embed_dict["description"] = description
-
-    await submission.author.load()
-    if name := getattr(submission.author, "name"):
-        embed_dict.setdefault("author", {})["name"] = name
-    if icon_url := getattr(submission.author, "icon_img"):
-        embed_dict.setdefault("author", {})["icon_url"] = icon_url
+        if renderer is None:
+            renderer = DescriptionRenderer(cache_size=1)
+        embed_dict["description"] = await renderer.render(
+            description,
+            key=(submission.id, getattr(submission, "edited", False)),
+            max_length=max_description_length,
+        )
+
+    if authors is None:
+        authors = AuthorCache(maxsize=1)
+    if author := await authors.get(submission.author, lane=lane):
+        embed_dict["author"] = author
 
     return Embed.from_dict(embed_dict)
 
 
 def format_exception(error: Exception) -> str:
-    """Format an exception."""
+    """Format an exception, naming the function that caught it."""
     return "In {0}:\n{1}".format(
-        {traceback.extract_stack(None, 2)[0][2]},
+        sys._getframe(1).f_code.co_name,
         " ".join(traceback.format_exception(type(error), error, error.__traceback__)),
     )
 
@@ -152,9 +163,18 @@ def create_table(
     **kwargs,
 ) -> str:
     """Create a str table from data."""
+    import tabulate
+
     return tabulate.tabulate(data, headers="keys", tablefmt=tablefmt, **kwargs)
 
 
 def format_input(string: str) -> str:
     """Format input to be used."""
     return string.replace("r/", "").lower()
+
+
+def sort_option(string: str) -> str:
+    """Validate a listing sort option."""
+    if (option := string.lower()) not in SORTING_OPTIONS:
+        raise ValueError(f"Invalid sort option: {string}")
+    return option
@@ -0,0 +1,462 @@
+"""Collection of worker process helpers.
+
+The coordinator keeps the Discord connection and the commands, and hands
+subreddits out to workers that stream them from Reddit and send back rendered
+embeds. Workers connect to the coordinator through authenticated
+multiprocessing connections, so they can run as local processes or on other
+hosts without a message broker:
+
+    $ WORKER_AUTHKEY=secret python -m client.workers coordinator-host:7100
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import secrets
+import socket
+import sys
+import threading
+import time
+from collections import defaultdict
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import asyncpraw
+from asyncpraw.models import Submission
+
+from client.caches import AuthorCache, SeenSet
+from client.health import DEGRADED, DOWN, HEALTHY
+from client.index import compact
+from client.partition import HashRing
+from client.ratelimit import STREAM, RequestBudget
+from client.render import DescriptionRenderer
+from client.streams import AdaptiveStreamManager, StreamManager
+from client.utils import create_discord_embed
+from config import setup_logging
+
+HELLO = "hello"
+SETUP = "setup"
+ADD = "add"
+REMOVE = "remove"
+DELIVER = "deliver"
+HEARTBEAT = "heartbeat"
+STOP = "stop"
+
+SETTINGS = (
+    "REDDIT_CLIENT_ID",
+    "REDDIT_CLIENT_SECRET",
+    "REDDIT_OAUTH_URL",
+    "REDDIT_URL",
+    "REDDIT_REQUEST_RATE",
+    "REDDIT_REQUEST_BURST",
+    "AUTHOR_CACHE_SIZE",
+    "AUTHOR_CACHE_TTL",
+    "AUTHOR_CACHE_NEGATIVE_TTL",
+    "RENDER_CACHE_SIZE",
+    "RENDER_EXECUTOR_THRESHOLD",
+    "SEEN_RING_SIZE",
+    "STREAM_ENGINE",
+    "STREAM_SHARD_SIZE",
+    "STREAM_HOT_INTERVAL",
+    "STREAM_MAX_LATENCY",
+    "STREAM_MAX_BACKOFF",
+    "STREAM_FAILURE_THRESHOLD",
+    "STREAM_RESET_TIMEOUT",
+    "WORKER_TIMEOUT",
+)
+
+
+class WorkerPool:
+    """Partitions the streamed subreddits across worker processes.
+
+    Subreddits are placed on a consistent hash ring of the connected workers,
+    so a worker joining or leaving only moves its share. Moved subreddits take
+    their seen ids along and resume where the previous worker stopped. Workers
+    that stop sending heartbeats for timeout seconds are dropped. The pool
+    exposes the same sync, close and health interface as a stream manager.
+    """
+
+    def __init__(
+        self,
+        callback: Callable[[str, str, float, Dict, Optional[Dict]], None],
+        settings: Dict[str, Any],
+        workers: Optional[int] = 2,
+        address: Optional[Tuple[str, int]] = ("127.0.0.1", 0),
+        authkey: Optional[bytes] = None,
+        seen: Optional[SeenSet] = None,
+        timeout: Optional[float] = 30,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        """Init method."""
+        self.callback = callback
+        self.settings = settings
+        self.workers = workers
+        self.address = address
+        self.authkey = authkey or secrets.token_bytes(32)
+        self.seen = SeenSet() if seen is None else seen
+        self.timeout = timeout
+        self.logger = logger or logging.getLogger(__name__)
+        self.ring = HashRing()
+        self.connections: Dict[str, Connection] = {}
+        self.heartbeats: Dict[str, float] = {}
+        self.status: Dict[str, Dict[str, Any]] = {}
+        self.assignments: Dict[str, str] = {}
+        self.wanted: Set[str] = set()
+        self.fresh: Set[str] = set()
+        self.processes: List[multiprocessing.Process] = []
+        self.listener: Optional[Listener] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.monitor: Optional[asyncio.Task] = None
+        self.stopping: Optional[asyncio.Future] = None
+
+    @property
+    def subreddits(self) -> Set[str]:
+        """Subreddits currently handed out to workers."""
+        return set(self.assignments)
+
+    @property
+    def shards(self) -> List[str]:
+        """Names of the connected workers."""
+        return list(self.connections)
+
+    @property
+    def health(self) -> Dict[str, Any]:
+        """Overall status along with the health reported by every worker."""
+        counts = defaultdict(int)
+        for worker in self.assignments.values():
+            counts[worker] += 1
+        shards = {
+            name: {
+                "state": self.status.get(name, {}).get("status", HEALTHY),
+                "failures": self.status.get(name, {}).get("failures", 0),
+                "subreddits": counts[name],
+            }
+            for name in self.connections
+        }
+        if not shards:
+            status = DOWN
+        elif len(shards) >= self.workers and all(
+            shard["state"] == HEALTHY for shard in shards.values()
+        ):
+            status = HEALTHY
+        else:
+            status = DEGRADED
+        return {"status": status, "shards": shards}
+
+    def start(self) -> None:
+        """Listens for workers and spawns the local ones, from the event loop."""
+        self.loop = asyncio.get_running_loop()
+        self.listener = Listener(self.address, authkey=self.authkey)
+        threading.Thread(target=self.accept, name="worker-accept", daemon=True).start()
+        context = multiprocessing.get_context("spawn")
+        for index in range(self.workers):
+            process = context.Process(
+                target=main,
+                args=(self.listener.address, self.authkey, f"worker-{index}"),
+                name=f"worker-{index}",
+                daemon=True,
+            )
+            process.start()
+            self.processes.append(process)
+        self.monitor = self.loop.create_task(self.watch(), name="worker-monitor")
+
+    def accept(self) -> None:
+        """Accepts worker connections until the listener closes."""
+        while self.listener is not None:
+            try:
+                connection = self.listener.accept()
+            except (OSError, EOFError, multiprocessing.AuthenticationError) as error:
+                if self.listener is None:
+                    return
+                self.logger.warning(f"Worker connection refused: {error!r}")
+                continue
+            threading.Thread(
+                target=self.read, args=(connection,), name="worker-read", daemon=True
+            ).start()
+
+    def read(self, connection: Connection) -> None:
+        """Forwards the messages of a worker to the event loop."""
+        name = None
+        try:
+            hello = connection.recv()
+            name = asyncio.run_coroutine_threadsafe(
+                self.join(hello["name"], connection), self.loop
+            ).result()
+            while True:
+                message = connection.recv()
+                self.loop.call_soon_threadsafe(self.receive, name, message)
+        except (EOFError, OSError):
+            if name is not None:
+                self.loop.call_soon_threadsafe(self.left, name, connection)
+
+    async def join(self, name: str, connection: Connection) -> str:
+        """Runs joined on the event loop for the reading thread."""
+        return self.joined(name, connection)
+
+    def joined(self, name: str, connection: Connection) -> str:
+        """Adds a worker to the ring and moves its share of subreddits to it.
+        Returns the name it was given, made unique among the connected workers.
+        """
+        unique, number = name, 1
+        while unique in self.connections:
+            unique, number = f"{name}-{number}", number + 1
+        name = unique
+        self.connections[name] = connection
+        self.heartbeats[name] = time.monotonic()
+        self.send(name, {"type": SETUP, "name": name, "settings": self.settings})
+        self.ring.add(name)
+        self.logger.info(f"Worker {name} joined")
+        self.rebalance()
+        return name
+
+    def left(self, name: str, connection: Connection) -> None:
+        """Removes a worker and hands its subreddits to the others."""
+        if self.connections.get(name) is not connection:
+            return
+        del self.connections[name]
+        self.heartbeats.pop(name, None)
+        self.status.pop(name, None)
+        self.ring.remove(name)
+        connection.close()
+        for subreddit in [s for s, w in self.assignments.items() if w == name]:
+            del self.assignments[subreddit]
+        self.logger.warning(f"Worker {name} left")
+        self.rebalance()
+
+    def receive(self, name: str, message: Dict[str, Any]) -> None:
+        """Handles a message from a worker."""
+        if message["type"] == HEARTBEAT:
+            self.heartbeats[name] = time.monotonic()
+            self.status[name] = message["health"]
+        elif message["type"] == DELIVER:
+            if self.seen.add(message["subreddit"], message["submission_id"]):
+                self.callback(
+                    message["subreddit"],
+                    message["submission_id"],
+                    message["created"],
+                    message["embed"],
+                    message.get("record"),
+                )
+
+    def send(self, name: str, message: Dict[str, Any]) -> None:
+        """Sends a message to a worker, dropping it if the connection broke."""
+        if (connection := self.connections.get(name)) is None:
+            return
+        try:
+            connection.send(message)
+        except OSError:
+            self.left(name, connection)
+
+    def sync(self, subreddits: Iterable[str], resume: bool = False) -> None:
+        """Hands out the wanted subreddits, starting the pool on first use."""
+        if self.listener is None:
+            self.start()
+        wanted = set(subreddits)
+        if not resume:
+            self.fresh |= wanted - self.wanted
+        self.fresh &= wanted
+        self.wanted = wanted
+        self.rebalance()
+
+    def rebalance(self) -> None:
+        """Moves every subreddit to the worker the ring assigns it to."""
+        adds: Dict[str, Dict[str, Dict]] = defaultdict(dict)
+        removes: Dict[str, List[str]] = defaultdict(list)
+        for subreddit, worker in tuple(self.assignments.items()):
+            if subreddit not in self.wanted or self.ring.node_for(subreddit) != worker:
+                removes[worker].append(subreddit)
+                del self.assignments[subreddit]
+        for subreddit in sorted(self.wanted - set(self.assignments)):
+            if (worker := self.ring.node_for(subreddit)) is None:
+                continue
+            adds[worker][subreddit] = {
+                "ring": list(self.seen.rings.get(subreddit, ())),
+                "resume": subreddit not in self.fresh,
+            }
+            self.fresh.discard(subreddit)
+            self.assignments[subreddit] = worker
+        for worker, subreddits in removes.items():
+            self.send(worker, {"type": REMOVE, "subreddits": subreddits})
+        for worker, subreddits in adds.items():
+            self.send(worker, {"type": ADD, "subreddits": subreddits})
+
+    async def watch(self) -> None:
+        """Drops workers that stopped sending heartbeats."""
+        while True:
+            await asyncio.sleep(self.timeout / 3)
+            now = time.monotonic()
+            for name, last in tuple(self.heartbeats.items()):
+                if now - last > self.timeout and (
+                    connection := self.connections.get(name)
+                ):
+                    self.logger.warning(f"Worker {name} timed out")
+                    self.left(name, connection)
+
+    def close(self) -> None:
+        """Stops every worker and the listener.
+        The local processes are joined in an executor, see wait_closed.
+        """
+        if self.monitor is not None:
+            self.monitor.cancel()
+        for name in tuple(self.connections):
+            self.send(name, {"type": STOP})
+        listener, self.listener = self.listener, None
+        if listener is not None:
+            listener.close()
+        if self.processes:
+            self.stopping = self.loop.run_in_executor(None, self.reap, self.processes)
+        self.processes = []
+        self.connections = {}
+        self.assignments = {}
+
+    @staticmethod
+    def reap(processes: List[multiprocessing.Process]) -> None:
+        """Waits for the processes to exit, terminating the ones that do not."""
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+
+    async def wait_closed(self) -> None:
+        """Waits until the local processes stopped by close have exited."""
+        if self.stopping is not None:
+            await self.stopping
+
+
+class Worker:
+    """Streams the subreddits assigned by the coordinator and renders their embeds."""
+
+    def __init__(self, connection: Connection, name: str) -> None:
+        """Init method."""
+        self.connection = connection
+        self.name = name
+        self.logger = logging.getLogger(__name__)
+
+    def configure(self, settings: Dict[str, Any]) -> None:
+        """Builds the reddit client and the stream manager from the settings."""
+        self.settings = settings
+        self.reddit = asyncpraw.Reddit(
+            client_id=settings["REDDIT_CLIENT_ID"],
+            client_secret=settings["REDDIT_CLIENT_SECRET"],
+            user_agent=f"DISCORD_BOT:{settings['REDDIT_CLIENT_ID']}:1.0",
+            oauth_url=settings["REDDIT_OAUTH_URL"],
+            reddit_url=settings["REDDIT_URL"],
+        )
+        self.budget = RequestBudget(
+            reddit=self.reddit,
+            rate=settings["REDDIT_REQUEST_RATE"],
+            burst=settings["REDDIT_REQUEST_BURST"],
+        )
+        self.authors = AuthorCache(
+            maxsize=settings["AUTHOR_CACHE_SIZE"],
+            ttl=settings["AUTHOR_CACHE_TTL"],
+            negative_ttl=settings["AUTHOR_CACHE_NEGATIVE_TTL"],
+            budget=self.budget,
+        )
+        self.renderer = DescriptionRenderer(
+            cache_size=settings["RENDER_CACHE_SIZE"],
+            executor_threshold=settings["RENDER_EXECUTOR_THRESHOLD"],
+        )
+        self.seen = SeenSet(ring_size=settings["SEEN_RING_SIZE"])
+        stream_options = {
+            "reddit": self.reddit,
+            "callback": self.deliver,
+            "shard_size": settings["STREAM_SHARD_SIZE"],
+            "seen": self.seen,
+            "logger": self.logger,
+            "budget": self.budget,
+            "max_backoff": settings["STREAM_MAX_BACKOFF"],
+            "failure_threshold": settings["STREAM_FAILURE_THRESHOLD"],
+            "reset_timeout": settings["STREAM_RESET_TIMEOUT"],
+        }
+        if settings["STREAM_ENGINE"] == "adaptive":
+            self.streams = AdaptiveStreamManager(
+                hot_interval=settings["STREAM_HOT_INTERVAL"],
+                max_latency=settings["STREAM_MAX_LATENCY"],
+                **stream_options,
+            )
+        else:
+            self.streams = StreamManager(**stream_options)
+
+    async def run(self) -> None:
+        """Serves the coordinator until it says stop or goes away."""
+        loop = asyncio.get_running_loop()
+        self.connection.send({"type": HELLO, "name": self.name})
+        setup = await loop.run_in_executor(None, self.connection.recv)
+        self.name = setup["name"]
+        self.configure(setup["settings"])
+        heartbeat = loop.create_task(self.beat())
+        try:
+            while (message := await loop.run_in_executor(None, self.connection.recv))[
+                "type"
+            ] != STOP:
+                self.handle(message)
+        except (EOFError, OSError):
+            self.logger.warning(f"{self.name} lost the coordinator")
+        finally:
+            heartbeat.cancel()
+            self.streams.close()
+            await self.reddit.close()
+            self.renderer.close()
+
+    def handle(self, message: Dict[str, Any]) -> None:
+        """Applies an assignment change."""
+        if message["type"] == ADD:
+            for subreddit, assignment in message["subreddits"].items():
+                if assignment["ring"]:
+                    self.seen.load({subreddit: assignment["ring"]})
+                self.streams.add(subreddit, resume=assignment["resume"])
+        elif message["type"] == REMOVE:
+            [self.streams.remove(subreddit) for subreddit in message["subreddits"]]
+
+    async def deliver(self, submission: Submission) -> None:
+        """Renders a submission and sends it to the coordinator."""
+        embed = await create_discord_embed(
+            submission, authors=self.authors, renderer=self.renderer, lane=STREAM
+        )
+        self.connection.send(
+            {
+                "type": DELIVER,
+                "subreddit": submission.subreddit.display_name.lower(),
+                "submission_id": submission.id,
+                "created": submission.created_utc,
+                "embed": embed.to_dict(),
+                "record": compact(submission),
+            }
+        )
+
+    async def beat(self) -> None:
+        """Reports the stream health to the coordinator."""
+        while True:
+            health = self.streams.health
+            self.connection.send(
+                {
+                    "type": HEARTBEAT,
+                    "health": {
+                        "status": health["status"],
+                        "failures": sum(
+                            shard["failures"] for shard in health["shards"].values()
+                        ),
+                    },
+                }
+            )
+            await asyncio.sleep(self.settings["WORKER_TIMEOUT"] / 3)
+
+
+def main(address: Tuple[str, int], authkey: bytes, name: str) -> None:
+    """Connects to the coordinator and works until told to stop."""
+    setup_logging(name=name)
+    connection = Client(address, authkey=authkey)
+    asyncio.run(Worker(connection=connection, name=name).run())
+
+
+if __name__ == "__main__":
+    host, port = sys.argv[1].rsplit(":", 1)
+    main(
+        address=(host, int(port)),
+        authkey=os.environ["WORKER_AUTHKEY"].encode("utf-8"),
+        name=sys.argv[2]
+        if len(sys.argv) > 2
+        else f"{socket.gethostname()}-{os.getpid()}",
+    )
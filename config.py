@@ -1,10 +1,12 @@
 """Main configuration file for the application."""
-import logging
 import os
-from logging.config import dictConfig
+from logging.handlers import QueueListener
+from typing import Optional
+
 from dotenv import load_dotenv
 
-from env import EnvMixin
+from client import logs
+from env import EnvMixin, strtobool
 
 load_dotenv()
 
@@ -13,29 +15,24 @@ ENVIRONMENT = os.environ.get("ENVIRONMENT", "development")
 BASE_DIR = os.path.dirname(os.path.realpath(__file__))
 LOGFILENAME = os.getenv("LOGFILENAME", default="discord_bot")
 
-dictConfig(
-    {
-        "version": 1,
-        "formatters": {
-            "default": {
-                "format": "[%(asctime)s] %(levelname)s in %(module)s: %(message)s",
-            }
-        },
-        "handlers": {
-            f"{LOGFILENAME}": {
-                "class": "logging.FileHandler",
-                "filename": os.path.join(BASE_DIR, f"logs/{LOGFILENAME}.log"),
-                "encoding": "utf-8",
-                "mode": "a",
-                "formatter": "default",
-            }
-        },
-        "root": {
-            "level": os.getenv("LOGLEVEL", default=logging.DEBUG),
-            "handlers": [f"{LOGFILENAME}"],
-        },
-    }
-)
+
+def setup_logging(name: Optional[str] = None) -> QueueListener:
+    """Writes the logs of this process to logs/<LOGFILENAME>.log.
+    Worker and shard processes pass their name to log to a file of their own,
+    as only one process may rotate a file.
+    """
+    filename = f"{LOGFILENAME}-{name}" if name else LOGFILENAME
+    return logs.setup_logging(
+        filename=os.path.join(BASE_DIR, f"logs/{filename}.log"),
+        name=name,
+        level=os.getenv("LOGLEVEL", default="INFO"),
+        max_bytes=int(os.getenv("LOG_MAX_BYTES", default=10 * 1024 * 1024)),
+        backup_count=int(os.getenv("LOG_BACKUP_COUNT", default=5)),
+        when=os.getenv("LOG_ROTATE_WHEN") or None,
+        structured=os.getenv("LOG_FORMAT", default="text").lower() == "json",
+        duplicate_interval=float(os.getenv("LOG_DUPLICATE_INTERVAL", default=60)),
+        duplicate_burst=int(os.getenv("LOG_DUPLICATE_BURST", default=3)),
+    )
 
 
 class BaseConfig(EnvMixin):
@@ -51,7 +48,73 @@ class BaseConfig(EnvMixin):
     DISCORD_BOT_NORMAL_COMMANDS_ROLES: list
     BASE_DIR: str = BASE_DIR
     FILENAME: str = os.path.join(BASE_DIR, "data/subreddits.json")
+    DATABASE: str = os.path.join(BASE_DIR, "data/bot.sqlite3")
     LOGFILENAME: str = LOGFILENAME
+    STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", default="json")
+    STORAGE_WRITE_DELAY: float = float(os.getenv("STORAGE_WRITE_DELAY", default=1.0))
+    STREAM_SHARD_SIZE: int = int(os.getenv("STREAM_SHARD_SIZE", default=100))
+    REDDIT_OAUTH_URL: str = os.getenv(
+        "REDDIT_OAUTH_URL", default="https://oauth.reddit.com"
+    )
+    REDDIT_URL: str = os.getenv("REDDIT_URL", default="https://www.reddit.com")
+    REDDIT_REQUEST_RATE: float = float(os.getenv("REDDIT_REQUEST_RATE", default=1.0))
+    REDDIT_REQUEST_BURST: float = float(os.getenv("REDDIT_REQUEST_BURST", default=10))
+    STREAM_MAX_BACKOFF: float = float(os.getenv("STREAM_MAX_BACKOFF", default=300))
+    STREAM_FAILURE_THRESHOLD: int = int(
+        os.getenv("STREAM_FAILURE_THRESHOLD", default=5)
+    )
+    STREAM_RESET_TIMEOUT: float = float(os.getenv("STREAM_RESET_TIMEOUT", default=60))
+    METRICS_HOST: str = os.getenv("METRICS_HOST", default="127.0.0.1")
+    METRICS_PORT: int = int(os.getenv("METRICS_PORT", default=9108))
+    PROFILING: bool = strtobool(os.getenv("PROFILING", default="false"))
+    PROFILE_INTERVAL: float = float(os.getenv("PROFILE_INTERVAL", default=0.005))
+    PROFILE_SLOW_CALLBACK: float = float(
+        os.getenv("PROFILE_SLOW_CALLBACK", default=0.05)
+    )
+    FETCH_MAX_COUNT: int = int(os.getenv("FETCH_MAX_COUNT", default=10))
+    INDEX_SIZE: int = int(os.getenv("INDEX_SIZE", default=10000))
+    INDEX_MAX_AGE: float = float(os.getenv("INDEX_MAX_AGE", default=604800))
+    RECENT_RING_SIZE: int = int(os.getenv("RECENT_RING_SIZE", default=10))
+    RECENT_MAX_AGE: float = float(os.getenv("RECENT_MAX_AGE", default=120))
+    STREAM_ENGINE: str = os.getenv("STREAM_ENGINE", default="shards")
+    STREAM_HOT_INTERVAL: float = float(os.getenv("STREAM_HOT_INTERVAL", default=30))
+    STREAM_MAX_LATENCY: float = float(os.getenv("STREAM_MAX_LATENCY", default=60))
+    WORKERS: int = int(os.getenv("WORKERS", default=0))
+    WORKER_HOST: str = os.getenv("WORKER_HOST", default="127.0.0.1")
+    WORKER_PORT: int = int(os.getenv("WORKER_PORT", default=0))
+    WORKER_AUTHKEY: str = os.getenv("WORKER_AUTHKEY", default="")
+    WORKER_TIMEOUT: float = float(os.getenv("WORKER_TIMEOUT", default=30))
+    DELIVERY_QUEUE_SIZE: int = int(os.getenv("DELIVERY_QUEUE_SIZE", default=100))
+    DELIVERY_QUEUE_POLICY: str = os.getenv(
+        "DELIVERY_QUEUE_POLICY", default="drop_oldest"
+    )
+    DELIVERY_BATCH_SIZE: int = int(os.getenv("DELIVERY_BATCH_SIZE", default=10))
+    DELIVERY_GLOBAL_RATE: float = float(os.getenv("DELIVERY_GLOBAL_RATE", default=50))
+    PLUGINS: list = [
+        x.strip() for x in os.getenv("PLUGINS", default="").split(",") if x.strip()
+    ]
+    SHARD_COUNT: int = int(os.getenv("SHARD_COUNT", default=0))
+    SHARD_IDS: list = [
+        int(x) for x in os.getenv("SHARD_IDS", default="").split(",") if x.strip()
+    ]
+    PROCESS_NAME: str = (
+        "shards-" + "-".join(map(str, SHARD_IDS)) if SHARD_COUNT and SHARD_IDS else ""
+    )
+    CATCH_UP_MAX_AGE: float = float(os.getenv("CATCH_UP_MAX_AGE", default=21600))
+    CATCH_UP_MAX_POSTS: int = int(os.getenv("CATCH_UP_MAX_POSTS", default=25))
+    SEEN_RING_SIZE: int = int(os.getenv("SEEN_RING_SIZE", default=50))
+    STATE_SAVE_INTERVAL: float = float(os.getenv("STATE_SAVE_INTERVAL", default=15))
+    AUTHOR_CACHE_SIZE: int = int(os.getenv("AUTHOR_CACHE_SIZE", default=4096))
+    AUTHOR_CACHE_TTL: float = float(os.getenv("AUTHOR_CACHE_TTL", default=3600))
+    AUTHOR_CACHE_NEGATIVE_TTL: float = float(
+        os.getenv("AUTHOR_CACHE_NEGATIVE_TTL", default=600)
+    )
+    RENDER_CACHE_SIZE: int = int(os.getenv("RENDER_CACHE_SIZE", default=2048))
+    RENDER_EXECUTOR_THRESHOLD: int = int(
+        os.getenv("RENDER_EXECUTOR_THRESHOLD", default=20000)
+    )
+    KINDS_POSITIVE_TTL: float = float(os.getenv("KINDS_POSITIVE_TTL", default=86400))
+    KINDS_NEGATIVE_TTL: float = float(os.getenv("KINDS_NEGATIVE_TTL", default=3600))
 
 
 class DevelopmentConfig(BaseConfig):
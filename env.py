@@ -1,9 +1,18 @@
 """Collection of environment variable helper functions."""
 import os
-from distutils.util import strtobool
 from typing import get_type_hints
 
 
+def strtobool(value: str) -> bool:
+    """Convert a string representation of truth to a bool."""
+    value = value.lower()
+    if value in ("y", "yes", "t", "true", "on", "1"):
+        return True
+    if value in ("n", "no", "f", "false", "off", "0"):
+        return False
+    raise ValueError(f"Invalid truth value: {value}")
+
+
 class EnvMixin:
     """Mixin class for environmental variables."""
 
@@ -1,17 +1,102 @@
+"""Plugin discovery.
+
+Plugins are modules of this package defining commands.Cog subclasses. They
+are listed in manifest.json when it exists, or found by parsing the modules
+without importing them, with the scan cached until a module changes. Classes
+deriving from Cog through other classes of the package are found as well. A
+plugin module is only imported when its cog is loaded.
+"""
+import ast
 import importlib
-import inspect
+import json
 import os
+from typing import Dict, List, Set, Tuple
 
 from discord.ext import commands
 
-Cogs = []
-for module in os.listdir(os.path.dirname(os.path.abspath(__file__))):
-    if module == "__init__.py" or module[-3:] != ".py":
-        continue
-    mdl = importlib.import_module(f"plugins.{module[:-3]}")
-    Cogs.extend(
-        obj
-        for name, obj in inspect.getmembers(object=mdl, predicate=inspect.isclass)
-        if issubclass(obj, commands.Cog)
-    )
-del module
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+MANIFEST = os.path.join(DIRECTORY, "manifest.json")
+SCAN_CACHE = os.path.join(DIRECTORY, "__pycache__", "plugins.json")
+
+Plugin = Tuple[str, str]
+
+
+def scan(filename: str) -> Dict[str, List[str]]:
+    """The classes of a module, with the last dotted name of each of their bases."""
+    with open(filename, encoding="utf-8") as file:
+        tree = ast.parse(file.read(), filename=filename)
+    return {
+        node.name: [ast.unparse(base).split(".")[-1] for base in node.bases]
+        for node in tree.body
+        if isinstance(node, ast.ClassDef)
+    }
+
+
+def resolve(classes: Dict[str, Dict[str, List[str]]]) -> Set[str]:
+    """Names of the scanned classes deriving from Cog, directly or not."""
+    cogs, found = {"Cog"}, True
+    while found:
+        found = False
+        for bases in classes.values():
+            for name, names in bases.items():
+                if name not in cogs and cogs.intersection(names):
+                    cogs.add(name)
+                    found = True
+    return cogs - {"Cog"}
+
+
+def discover() -> List[Plugin]:
+    """(module, class) pairs of every plugin cog."""
+    if os.path.exists(MANIFEST):
+        with open(MANIFEST, encoding="utf-8") as file:
+            return [tuple(entry.split(":", 1)) for entry in json.load(file)]
+    try:
+        with open(SCAN_CACHE, encoding="utf-8") as file:
+            cache: Dict[str, Dict] = json.load(file)
+    except (OSError, ValueError):
+        cache = {}
+    scanned = {}
+    for module in sorted(os.listdir(DIRECTORY)):
+        if module == "__init__.py" or module[-3:] != ".py":
+            continue
+        stat = os.stat(os.path.join(DIRECTORY, module))
+        entry = cache.get(module)
+        if (
+            entry is None
+            or entry["mtime"] != stat.st_mtime
+            or entry["size"] != stat.st_size
+            or "classes" not in entry
+        ):
+            entry = {
+                "mtime": stat.st_mtime,
+                "size": stat.st_size,
+                "classes": scan(os.path.join(DIRECTORY, module)),
+            }
+        scanned[module] = entry
+    cogs = resolve({module: entry["classes"] for module, entry in scanned.items()})
+    plugins = [
+        (module[:-3], name)
+        for module, entry in scanned.items()
+        for name in entry["classes"]
+        if name in cogs
+    ]
+    if scanned != cache:
+        try:
+            os.makedirs(os.path.dirname(SCAN_CACHE), exist_ok=True)
+            with open(SCAN_CACHE, "w", encoding="utf-8") as file:
+                json.dump(scanned, file)
+        except OSError:
+            pass
+    return plugins
+
+
+def load(plugin: Plugin) -> type:
+    """Imports a plugin module and returns its cog."""
+    module, name = plugin
+    cog = getattr(importlib.import_module(f"{__name__}.{module}"), name)
+    if not (isinstance(cog, type) and issubclass(cog, commands.Cog)):
+        raise TypeError(f"Plugin {module}:{name} is not a Cog")
+    return cog
+
+
+Cogs = discover()
@@ -0,0 +1,42 @@
+"""Tests of the caches in front of Reddit."""
+import unittest
+from types import SimpleNamespace
+
+from client.caches import AuthorCache
+from client.ratelimit import BACKGROUND, INTERACTIVE
+
+
+class RecordingBudget:
+    """A request budget recording the lane of every token taken."""
+
+    def __init__(self) -> None:
+        """Init method."""
+        self.lanes = []
+
+    async def acquire(self, lane: str) -> None:
+        """Takes a token."""
+        self.lanes.append(lane)
+
+
+class AuthorCacheTest(unittest.IsolatedAsyncioTestCase):
+    """Author lookups."""
+
+    async def test_lookup_uses_the_callers_lane(self) -> None:
+        """A command's lookup takes an interactive token, others a background one."""
+
+        async def load() -> None:
+            pass
+
+        budget = RecordingBudget()
+        authors = AuthorCache(budget=budget)
+        for name, lane in (("spez", INTERACTIVE), ("kn0thing", None)):
+            redditor = SimpleNamespace(name=name, load=load)
+            if lane:
+                await authors.get(redditor, lane=lane)
+            else:
+                await authors.get(redditor)
+        self.assertEqual(budget.lanes, [INTERACTIVE, BACKGROUND])
+
+
+if __name__ == "__main__":
+    unittest.main()
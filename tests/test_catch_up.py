@@ -0,0 +1,150 @@
+"""Tests of catching up on missed posts and resuming the streams."""
+import time
+import unittest
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from benchmarks.fake_reddit import base36
+from client.caches import SeenSet
+from client.streams import CatchUp, StreamShard
+
+
+class FakeMultireddit:
+    """The new listing of a multireddit, newest first."""
+
+    def __init__(self, posts: List[SimpleNamespace]) -> None:
+        """Init method."""
+        self.posts = posts
+
+    async def new(self, limit: Optional[int] = 100, params: Optional[Dict] = None):
+        """Yields up to limit posts, after the fullname in params when given."""
+        posts = self.posts
+        if params and params.get("after"):
+            after = params["after"].split("_", 1)[1]
+            index = next(i for i, post in enumerate(posts) if post.id == after)
+            posts = posts[index + 1 :]
+        for post in posts[:limit]:
+            yield post
+
+
+class FakeReddit:
+    """A reddit with a single subreddit."""
+
+    def __init__(self, posts: List[SimpleNamespace]) -> None:
+        """Init method."""
+        self.posts = posts
+
+    async def subreddit(self, name: str) -> FakeMultireddit:
+        """The multireddit of the given subreddits."""
+        return FakeMultireddit(sorted(self.posts, key=lambda p: -p.created_utc))
+
+
+def post(number: int, created: float) -> SimpleNamespace:
+    """A submission of r/python."""
+    return SimpleNamespace(
+        id=base36(number),
+        fullname=f"t3_{base36(number)}",
+        created_utc=created,
+        subreddit=SimpleNamespace(display_name="Python"),
+    )
+
+
+class CatchUpTest(unittest.IsolatedAsyncioTestCase):
+    """Catch up followed by the resumed stream."""
+
+    async def test_resumed_stream_skips_caught_up_posts(self) -> None:
+        """Only the newest max_posts missed posts are sent, and only once."""
+        now = time.time()
+        old = [post(1000 + number, now - 3600 + number) for number in range(5)]
+        missed = [post(2000 + number, now - 600 + number) for number in range(60)]
+        seen = SeenSet()
+        for submission in old:
+            seen.add("python", submission.id)
+        reddit = FakeReddit(old + missed)
+        sent = []
+
+        async def send(submission: SimpleNamespace) -> None:
+            sent.append(submission.id)
+
+        catch_up = CatchUp(reddit, send, seen, max_posts=25)
+        cursor = (old[-1].id, old[-1].created_utc)
+        self.assertEqual(await catch_up.run({"python": cursor}), 25)
+        self.assertEqual(sent, [submission.id for submission in missed[-25:]])
+
+        shard = StreamShard(reddit, send, seen=seen)
+        shard.add("python", resume=True)
+        self.assertEqual(await shard.poll(), [])
+        self.assertEqual(len(sent), len(set(sent)))
+
+    async def test_old_posts_are_marked_seen(self) -> None:
+        """Missed posts older than max_age are never sent."""
+        now = time.time()
+        missed = [post(3000 + number, now - 7200 + number) for number in range(10)]
+        seen = SeenSet()
+        seen.add("python", base36(2999))
+        sent = []
+
+        async def send(submission: SimpleNamespace) -> None:
+            sent.append(submission.id)
+
+        reddit = FakeReddit(missed)
+        catch_up = CatchUp(reddit, send, seen, max_age=3600)
+        self.assertEqual(await catch_up.run({"python": (base36(2999), now - 8000)}), 0)
+        shard = StreamShard(reddit, send, seen=seen)
+        shard.add("python", resume=True)
+        self.assertEqual(await shard.poll(), [])
+
+
+class CountingBudget:
+    """A request budget counting the tokens taken."""
+
+    def __init__(self) -> None:
+        """Init method."""
+        self.acquired = 0
+
+    async def acquire(self, priority: str) -> None:
+        """Takes a token."""
+        self.acquired += 1
+
+
+class CatchUpPagingTest(unittest.IsolatedAsyncioTestCase):
+    """Paging the new listing back to the cursors."""
+
+    async def test_one_token_per_page(self) -> None:
+        """Every page of a hundred posts takes its own request token."""
+        now = time.time()
+        missed = [post(4000 + number, now - 600 + number) for number in range(250)]
+        budget = CountingBudget()
+        seen = SeenSet(ring_size=150)
+        seen.add("python", base36(3999))
+
+        async def send(submission: SimpleNamespace) -> None:
+            pass
+
+        catch_up = CatchUp(FakeReddit(missed), send, seen, budget=budget)
+        await catch_up.run({"python": (base36(3999), now - 601)})
+        self.assertEqual(budget.acquired, 2)
+        self.assertTrue(seen.seen("python", missed[100].id))
+
+
+class SeenSetTest(unittest.TestCase):
+    """The rings of remembered ids."""
+
+    def test_full_ring_drops_smallest_id(self) -> None:
+        """Ids added out of order keep the newest ring_size ones."""
+        seen = SeenSet(ring_size=3)
+        for number in (2, 5, 3, 4, 1):
+            seen.add("python", base36(number))
+        self.assertEqual(seen.rings["python"], ["3", "4", "5"])
+        self.assertTrue(seen.seen("python", "2"))
+        self.assertFalse(seen.seen("python", "6"))
+
+    def test_load_sorts_rings(self) -> None:
+        """Restored rings are sorted and cut to ring_size."""
+        seen = SeenSet(ring_size=2)
+        seen.load({"python": ["c", "a", "b"]})
+        self.assertEqual(seen.rings["python"], ["b", "c"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+"""Tests of the reddit commands cog against a fake bot."""
+import asyncio
+import os
+import tempfile
+import unittest
+
+from discord import Embed
+
+from benchmarks.fake_discord import FakeBot
+from benchmarks.scenarios import BenchmarkConfig
+from client.cogs import RedditCommands
+
+
+class StartingBot(FakeBot):
+    """A fake bot that is not ready until told so."""
+
+    def __init__(self, config: object) -> None:
+        """Init method."""
+        super().__init__(config=config)
+        self.ready = asyncio.Event()
+
+    def is_ready(self) -> bool:
+        """Checks if READY was received."""
+        return self.ready.is_set()
+
+    async def wait_until_ready(self) -> None:
+        """Waits for READY."""
+        await self.ready.wait()
+
+
+class RedditCommandsTest(unittest.IsolatedAsyncioTestCase):
+    """Delivery around the READY event."""
+
+    async def asyncSetUp(self) -> None:
+        """Creates the cog with one subscription and no channel yet."""
+        self.directory = tempfile.TemporaryDirectory()
+        config = BenchmarkConfig()
+        config.FILENAME = os.path.join(self.directory.name, "subreddits.json")
+        config.REDDIT_OAUTH_URL = config.REDDIT_URL = "http://127.0.0.1:9"
+        self.bot = StartingBot(config=config)
+        self.cog = RedditCommands(bot=self.bot)
+        self.cog.reddit.subscriptions.subscribe([(1, "python")])
+        self.runs = []
+
+        async def run(cursors: dict) -> int:
+            self.runs.append(cursors)
+            return 0
+
+        self.cog.catch_up.run = run
+
+    async def asyncTearDown(self) -> None:
+        """Closes the cog."""
+        await self.cog.close()
+        self.directory.cleanup()
+
+    async def test_catch_up_waits_for_ready(self) -> None:
+        """Nothing is caught up or streamed before READY."""
+        self.cog.sync_streams()
+        await asyncio.sleep(0.1)
+        self.assertEqual((self.runs, self.cog.streams.subreddits), ([], set()))
+        self.bot.add_channel(1)
+        self.bot.ready.set()
+        await asyncio.sleep(0.1)
+        self.assertEqual(len(self.runs), 1)
+        self.assertEqual(self.cog.streams.subreddits, {"python"})
+
+    async def test_cursor_waits_for_a_channel(self) -> None:
+        """A post no channel took does not move the cursor."""
+        embed = Embed(title="post")
+        self.cog.deliver_embed("python", "a", created=1.0, embed=embed)
+        self.assertNotIn("python", self.cog.reddit.cursors)
+        self.bot.add_channel(1)
+        self.cog.deliver_embed("python", "b", created=2.0, embed=embed)
+        self.assertEqual(self.cog.reddit.cursors["python"], ("b", 2.0))
+
+    async def test_ingested_counts_new_posts_only(self) -> None:
+        """Polling a post again counts as repolled, not ingested."""
+        self.cog.reddit.seen.add("python", "a")
+        self.cog.reddit.seen.add("python", "a")
+        self.cog.deliver_embed("python", "a", created=1.0, embed=None)
+        summary = self.cog.metrics.summary()
+        self.assertEqual(summary["reddit_submissions_ingested_total"], 1)
+        self.assertEqual(summary["reddit_submissions_repolled_total"], 1)
+
+
+class WorkerQuotaTest(unittest.IsolatedAsyncioTestCase):
+    """The Reddit quota in worker mode."""
+
+    async def test_coordinator_and_workers_share_the_quota(self) -> None:
+        """The coordinator takes one share of the rate, like each worker."""
+        with tempfile.TemporaryDirectory() as directory:
+            config = BenchmarkConfig()
+            config.FILENAME = os.path.join(directory, "subreddits.json")
+            config.WORKERS, config.REDDIT_REQUEST_RATE = 3, 2.0
+            cog = RedditCommands(bot=FakeBot(config=config))
+            try:
+                self.assertEqual(cog.reddit.budget.bucket.rate, 0.5)
+                self.assertEqual(cog.streams.settings["REDDIT_REQUEST_RATE"], 0.5)
+            finally:
+                await cog.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+"""Tests of sending embeds to channels."""
+import asyncio
+import unittest
+from types import SimpleNamespace
+
+from discord import Embed
+
+from client.delivery import MERGE, ChannelQueue, DeliveryScheduler
+
+
+class FlakyChannel:
+    """A channel whose first send fails with an unexpected error."""
+
+    def __init__(self) -> None:
+        """Init method."""
+        self.id = 1
+        self.sent = []
+
+    async def send(self, embed: Embed) -> None:
+        """Records the embed, after failing once."""
+        if not self.sent:
+            self.sent.append(None)
+            raise RuntimeError("connection reset")
+        self.sent.append(embed.title)
+
+
+class DeliverySchedulerTest(unittest.IsolatedAsyncioTestCase):
+    """Draining the queue of a channel."""
+
+    async def test_failed_send_keeps_draining(self) -> None:
+        """An unexpected error drops its embed and the next ones are still sent."""
+        scheduler = DeliveryScheduler(bot=SimpleNamespace(), batch_size=1)
+        channel = FlakyChannel()
+        with self.assertLogs(scheduler.logger, "ERROR") as logs:
+            for title in ("first", "second"):
+                scheduler.submit(channel=channel, embed=Embed(title=title))
+            await asyncio.wait_for(scheduler.queues[1].task, timeout=5)
+        self.assertEqual(channel.sent, [None, "second"])
+        self.assertEqual((scheduler.sent, scheduler.dropped), (1, 1))
+        self.assertEqual(logs.records[0].channel_id, 1)
+
+
+class ChannelQueueTest(unittest.TestCase):
+    """The merge policy of a full queue."""
+
+    def test_summary_is_sent_alone(self) -> None:
+        """A long summary never shares a message with other embeds."""
+        queue = ChannelQueue(channel=SimpleNamespace(id=1), maxsize=10, policy=MERGE)
+        for number in range(60):
+            queue.put(Embed(title="t" * 200, url=f"https://redd.it/{number}"))
+        summary = queue.take(10)
+        self.assertEqual(len(summary), 1)
+        self.assertLessEqual(len(summary[0]), 6000)
+        self.assertEqual(len(queue.take(10)), 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
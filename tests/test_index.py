@@ -0,0 +1,111 @@
+"""Tests of fetches answered from the posts the streams have seen."""
+import os
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from typing import Optional
+
+from client.index import RecentPosts, TitleIndex, compact
+from client.mixins import Reddit
+from client.streams import StreamManager
+
+
+def post(number: int, title: str, author: Optional[str] = None) -> SimpleNamespace:
+    """A streamed submission of r/python."""
+    return SimpleNamespace(
+        id=f"p{number}",
+        title=title,
+        created=time.time() - 60 + number,
+        created_utc=time.time() - 60 + number,
+        edited=False,
+        subreddit=SimpleNamespace(display_name="Python"),
+        author=SimpleNamespace(name=author) if author else None,
+    )
+
+
+class FetchFromStreamsTest(unittest.IsolatedAsyncioTestCase):
+    """Newest posts and searches answered without calling Reddit."""
+
+    async def asyncSetUp(self) -> None:
+        """Creates a reddit mixin whose streams saw a deleted author's post."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.reddit = Reddit(
+            client_id="id",
+            client_secret="secret",
+            filename=os.path.join(self.directory.name, "data.json"),
+        )
+        for submission in (post(1, "Release notes", "guido"), post(2, "Asyncio tips")):
+            self.reddit.index.add(compact(submission))
+            self.reddit.recent.add(compact(submission))
+        self.reddit.recent.touch(["python"])
+        self.reddit.index.add({**compact(post(3, "Asyncio news")), "author": None})
+
+    async def asyncTearDown(self) -> None:
+        """Closes the mixin."""
+        await self.reddit.close()
+        self.directory.cleanup()
+
+    async def test_newest_with_deleted_author(self) -> None:
+        """The recent ring rebuilds posts of deleted accounts."""
+        submissions = await self.reddit.fetch("python", limit=2)
+        self.assertEqual([submission.id for submission in submissions], ["p2", "p1"])
+        self.assertIsNone(submissions[0].author)
+        self.assertEqual(submissions[1].author.name, "guido")
+
+    async def test_search_with_deleted_author(self) -> None:
+        """The title index rebuilds posts of deleted accounts."""
+        submissions = await self.reddit.fetch("python", search_term="asyncio", limit=2)
+        self.assertEqual([submission.id for submission in submissions], ["p3", "p2"])
+        self.assertIsNone(submissions[0].author)
+        self.assertIsNone(submissions[1].author)
+
+
+class TitleIndexTest(unittest.TestCase):
+    """Searches the index answers and the ones left to Reddit."""
+
+    def setUp(self) -> None:
+        """Indexes a few titles of r/python."""
+        self.index = TitleIndex()
+        for number, title in enumerate(
+            ("Learning C today", "Picture of a snake", "Tips for asyncio news")
+        ):
+            self.index.add(compact(post(number, title)))
+
+    def test_phrase_match(self) -> None:
+        """Words of the query must appear together and in order."""
+        self.assertEqual(
+            [record["id"] for record in self.index.search("python", "asyncio+news")],
+            ["p2"],
+        )
+        self.assertEqual(self.index.search("python", "news+asyncio"), [])
+        self.assertEqual(self.index.search("python", "tips+news"), [])
+
+    def test_fallback(self) -> None:
+        """Queries the index cannot represent are never answered from it."""
+        for query in ("c++", "c#", "+", "", "!!"):
+            with self.subTest(query=query):
+                self.assertEqual(self.index.search("python", query), [])
+        self.assertEqual(self.index.hits, 0)
+        self.assertEqual(self.index.misses, 5)
+
+
+class ForgetTest(unittest.IsolatedAsyncioTestCase):
+    """Rings of subreddits no longer streamed."""
+
+    async def test_unsubscribed_ring_dropped(self) -> None:
+        """Syncing away a subreddit drops its newest posts."""
+        recent = RecentPosts()
+        streams = StreamManager(reddit=None, callback=None, recent=recent)
+        streams.sync(["python", "rust"])
+        for number, subreddit in enumerate(("python", "rust")):
+            recent.add({**compact(post(number, "Title")), "subreddit": subreddit})
+        recent.touch(["python", "rust"])
+        streams.sync(["rust"])
+        streams.close()
+        self.assertEqual(recent.newest("python"), [])
+        self.assertEqual(len(recent.newest("rust")), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+"""Tests of plugin discovery."""
+import os
+import tempfile
+import unittest
+
+import plugins
+
+
+class DiscoveryTest(unittest.TestCase):
+    """Finding cogs without importing their modules."""
+
+    def test_indirect_subclasses_are_found(self) -> None:
+        """Cogs deriving from another cog of the package are plugins too."""
+        with tempfile.TemporaryDirectory() as directory:
+            for module, source in (
+                ("base", "class SharedBaseCog(commands.Cog):\n    pass\n"),
+                (
+                    "mine",
+                    "from plugins.base import SharedBaseCog\n\n"
+                    "class Mine(SharedBaseCog):\n    pass\n\n"
+                    "class Helper:\n    pass\n",
+                ),
+            ):
+                with open(os.path.join(directory, f"{module}.py"), "w") as file:
+                    file.write(source)
+            classes = {
+                module: plugins.scan(os.path.join(directory, f"{module}.py"))
+                for module in ("base", "mine")
+            }
+        self.assertEqual(plugins.resolve(classes), {"SharedBaseCog", "Mine"})
+
+
+if __name__ == "__main__":
+    unittest.main()
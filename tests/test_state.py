@@ -0,0 +1,66 @@
+"""Tests of the state shared by processes through the storage backends."""
+import os
+import tempfile
+import unittest
+
+from client.mixins import Reddit
+
+
+class SharedStateTest(unittest.IsolatedAsyncioTestCase):
+    """Two processes using the same storage."""
+
+    async def asyncSetUp(self) -> None:
+        """Creates a storage directory."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.reddits = []
+
+    async def asyncTearDown(self) -> None:
+        """Closes every mixin."""
+        for reddit in self.reddits:
+            await reddit.close()
+        self.directory.cleanup()
+
+    def create(self, storage_backend: str, **kwargs) -> Reddit:
+        """A reddit mixin on the shared storage of a backend."""
+        directory = os.path.join(self.directory.name, storage_backend)
+        os.makedirs(directory, exist_ok=True)
+        reddit = Reddit(
+            client_id="id",
+            client_secret="secret",
+            filename=os.path.join(directory, "subreddits.json"),
+            database=os.path.join(directory, "bot.sqlite3"),
+            storage_backend=storage_backend,
+            **kwargs,
+        )
+        self.reddits.append(reddit)
+        return reddit
+
+    async def test_refresh_picks_up_other_processes(self) -> None:
+        """Bans and unsubscriptions made elsewhere are seen after a refresh."""
+        first = self.create(storage_backend="sqlite", state_name="shards-0")
+        second = self.create(storage_backend="sqlite", state_name="shards-1")
+        first.manage_subscription(channel_id=1, subreddit="python")
+        first.storage.flush_now()
+        self.assertTrue(await second.refresh_subscriptions())
+        self.assertEqual(second.get_channels("python"), {1})
+        first.manage_moderation(subreddit="python")
+        first.storage.flush_now()
+        self.assertTrue(await second.refresh_subscriptions())
+        self.assertTrue(second.subreddit_is_banned("python"))
+        self.assertEqual(second.get_channels("python"), set())
+        self.assertFalse(await second.refresh_subscriptions())
+
+    async def test_new_process_starts_from_shared_state(self) -> None:
+        """A process without state of its own loads the shared seen ids."""
+        for backend in ("json", "sqlite"):
+            with self.subTest(backend=backend):
+                shared = self.create(storage_backend=backend)
+                shared.seen.add(backend, "a")
+                shared.save()
+                shared.storage.flush_now()
+                named = self.create(storage_backend=backend, state_name="shards-0")
+                self.assertEqual(named.seen.dump(), {backend: ["a"]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+"""Tests of the coordinator side of the worker pool."""
+import asyncio
+import time
+import unittest
+
+from client.workers import HEARTBEAT, WorkerPool
+
+
+class FakeConnection:
+    """A worker connection replaying the given messages."""
+
+    def __init__(self, *messages: dict) -> None:
+        """Init method."""
+        self.messages = list(messages)
+        self.sent = []
+
+    def recv(self) -> dict:
+        """The next message, EOFError once there are none."""
+        if not self.messages:
+            raise EOFError
+        return self.messages.pop(0)
+
+    def send(self, message: dict) -> None:
+        """Records a message to the worker."""
+        self.sent.append(message)
+
+    def close(self) -> None:
+        """Closes the connection."""
+
+
+class WorkerPoolTest(unittest.IsolatedAsyncioTestCase):
+    """Workers joining, reporting and leaving."""
+
+    async def asyncSetUp(self) -> None:
+        """Creates a pool that is not listening."""
+        self.pool = WorkerPool(callback=lambda *args: None, settings={}, timeout=0.3)
+        self.pool.loop = asyncio.get_running_loop()
+
+    async def test_duplicate_name_is_credited_to_its_connection(self) -> None:
+        """A renamed worker's heartbeats and exit are handled under its new name."""
+        first = FakeConnection()
+        self.pool.joined("worker", first)
+        second = FakeConnection(
+            {"name": "worker"}, {"type": HEARTBEAT, "health": {"shards": {}}}
+        )
+        await asyncio.to_thread(self.pool.read, second)
+        await asyncio.sleep(0)
+        self.assertEqual(second.sent[0]["name"], "worker-1")
+        self.assertEqual(list(self.pool.connections), ["worker"])
+        self.assertNotIn("worker", self.pool.status)
+
+    async def test_watch_skips_workers_that_left(self) -> None:
+        """A worker removed while its heartbeat is stale does not stop the monitor."""
+        connection = FakeConnection()
+        self.pool.joined("worker", connection)
+        self.pool.heartbeats["worker"] = time.monotonic() - 1
+        del self.pool.connections["worker"]
+        monitor = asyncio.create_task(self.pool.watch())
+        await asyncio.sleep(0.2)
+        self.assertFalse(monitor.done())
+        monitor.cancel()
+
+
+if __name__ == "__main__":
+    unittest.main()